@@ -22,6 +22,12 @@ from langchain.evaluation import load_evaluator, StringEvaluator
 from langchain.evaluation.schema import EvaluatorType
 
 
+REQUESTS_COLLECTION = "ask-astro-dev-requests"
+FEEDS_COLLECTION = os.environ.get("FIRESTORE_FEEDS_COLLECTION", "feeds")
+EXAMPLE_FEED_DOCUMENT = os.environ.get("EXAMPLE_FEED_DOCUMENT", "examples")
+EXAMPLE_FEED_SIZE = int(os.environ.get("EXAMPLE_FEED_SIZE", 12))
+
+
 def get_firestore_client():
     """
     This function returns a Firestore client.
@@ -41,7 +47,7 @@ def get_unprocessed_runs():
 
     # get all requests that don't have a `is_example` field
     unprocessed_runs = (
-        firestore_client.collection("ask-astro-dev-requests")
+        firestore_client.collection(REQUESTS_COLLECTION)
         .where("is_processed", "==", False)
         .get()
     )
@@ -56,13 +62,35 @@ def process_run(run: dict[str, Any]):
     """
     print("Processing run", run)
 
+    firestore_client = get_firestore_client()
+
+    status = run.get("status")
+    if status in ("queued", "in_progress"):
+        # still being answered, so leave it for a later run
+        print("Skipping run that isn't answered yet")
+        return {}
+    if status != "complete":
+        # errored requests can't be examples, so only mark them as processed
+        print("Skipping run with status", status)
+        firestore_client.collection(REQUESTS_COLLECTION).document(run["uuid"]).set(
+            {"is_processed": True}, merge=True
+        )
+        return {}
+
+    run_id = run.get("langchain_run_id")
+    if run_id in (None, "None"):
+        # answers served from the semantic cache have no run to evaluate
+        print("Skipping run without a LangSmith run")
+        firestore_client.collection(REQUESTS_COLLECTION).document(run["uuid"]).set(
+            {"is_processed": True}, merge=True
+        )
+        return {}
+
     prompt = run["prompt"]
-    run_id = run["langchain_run_id"]
     response = run["response"]
     sources = run["sources"]
 
     langsmith_client = Client()
-    firestore_client = get_firestore_client()
 
     feedback = {}
     for criteria in [
@@ -112,15 +140,125 @@ def process_run(run: dict[str, Any]):
     update_dict = {"is_processed": True}
     if all([score > 0.9 for score in feedback.values()]):
         update_dict["is_example"] = True
+        update_dict.update(count_fields(run))
         print("Marking run as example")
 
-    firestore_client.collection("ask-astro-dev-requests").document(run["uuid"]).set(
+    firestore_client.collection(REQUESTS_COLLECTION).document(run["uuid"]).set(
         update_dict, merge=True
     )
 
     return feedback
 
 
+def count_fields(request: dict[str, Any]) -> dict[str, int]:
+    """
+    This function returns the source and message counts that the UI shows in the
+    example feed. They're stored on examples, so that the API can list them
+    without reading their sources and messages.
+    """
+    message_count = len(request.get("messages") or [])
+    if request.get("conversation_id"):
+        # follow-ups don't store their history, two messages per earlier turn
+        message_count = 2 * (request.get("turn_index") or 0)
+
+    return {
+        "source_count": len(request.get("sources") or []),
+        "message_count": message_count,
+    }
+
+
+def summarize(request: dict[str, Any]) -> dict[str, Any]:
+    """
+    This function returns the fields of a request that the UI shows in the
+    example feed. Keep it in sync with `summarize` in the API.
+    """
+    return {
+        "uuid": request["uuid"],
+        "prompt": request["prompt"],
+        "sent_at": request.get("sent_at"),
+        **count_fields(request),
+    }
+
+
+@task(trigger_rule="all_done")
+def backfill_example_counts():
+    """
+    This task stores the source and message counts on the examples marked before
+    they were stored, so that the API can list every example without reading its
+    sources and messages.
+    """
+    firestore_client = get_firestore_client()
+
+    examples = (
+        firestore_client.collection(REQUESTS_COLLECTION)
+        .select(
+            [
+                "sources",
+                "messages",
+                "conversation_id",
+                "turn_index",
+                "source_count",
+            ]
+        )
+        .where("is_example", "==", True)
+        .stream()
+    )
+
+    batch, pending, backfilled = firestore_client.batch(), 0, 0
+    for example in examples:
+        data = example.to_dict()
+        if "source_count" in data:
+            continue
+
+        batch.update(example.reference, count_fields(data))
+        pending += 1
+        backfilled += 1
+        # Firestore rejects batches with more writes than this
+        if pending == 500:
+            batch.commit()
+            batch, pending = firestore_client.batch(), 0
+
+    if pending:
+        batch.commit()
+    print("Backfilled the counts of", backfilled, "examples")
+
+
+@task(trigger_rule="all_done")
+def refresh_example_feed():
+    """
+    This task materializes the most recent examples into the single document
+    that the API serves the example feed from.
+    """
+    firestore_client = get_firestore_client()
+
+    examples = (
+        firestore_client.collection(REQUESTS_COLLECTION)
+        .select(
+            [
+                "uuid",
+                "prompt",
+                "sent_at",
+                "sources",
+                "messages",
+                "conversation_id",
+                "turn_index",
+            ]
+        )
+        .where("status", "==", "complete")
+        .where("is_example", "==", True)
+        .order_by("sent_at", direction="DESCENDING")
+        .order_by(firestore.FieldPath.document_id(), direction="DESCENDING")
+        .limit(EXAMPLE_FEED_SIZE)
+        .get()
+    )
+
+    feed = [summarize(example.to_dict()) for example in examples]
+    firestore_client.collection(FEEDS_COLLECTION).document(EXAMPLE_FEED_DOCUMENT).set(
+        {"requests": feed, "updated_at": int(datetime.now().timestamp())}
+    )
+    print("Refreshed example feed with", len(feed), "requests")
+
+
 @dag(
     schedule="@daily",
     start_date=datetime(2023, 1, 1),
@@ -131,7 +269,14 @@ def find_example_runs():
     unprocessed_runs = get_unprocessed_runs()
     end = EmptyOperator(task_id="end")
 
-    begin >> unprocessed_runs >> process_run.expand(run=unprocessed_runs) >> end
+    (
+        begin
+        >> unprocessed_runs
+        >> process_run.expand(run=unprocessed_runs)
+        >> backfill_example_counts()
+        >> refresh_example_feed()
+        >> end
+    )
 
 
 find_example_runs()
@@ -7,8 +7,16 @@ from logging import getLogger
 
 from sanic import Sanic, Request
 
+from ask_astro.config import WarmupConfig
+from ask_astro.clients.firestore import firestore_client
+from ask_astro.clients.http import close_http_session
+from ask_astro.container import services
+from ask_astro.encoding import dumps
+from ask_astro.services.admission import admission_controller
+from ask_astro.services.readiness import readiness
+from ask_astro.services.requests import request_store
 from ask_astro.slack.app import slack_app, app_handler
-from ask_astro.slack.controllers import register_controllers
+from ask_astro.rest.compression import compress_response
 from ask_astro.rest.controllers import register_routes
 
 # set the logging level based on an env var
@@ -16,7 +24,8 @@ logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
 
 logger = getLogger(__name__)
 
-api = Sanic(name="ask_astro")
+# every JSON response is encoded with orjson
+api = Sanic(name="ask_astro", dumps=dumps)
 
 
 # route slack requests to the slack app
@@ -25,13 +34,65 @@ api = Sanic(name="ask_astro")
 @api.post("/slack/events", name="events")
 async def endpoint(req: Request):
     "Forward requests to the Slack bolt hander"
-    return await app_handler.handle(req)
+    # the installation and state stores use the Firestore client, so make sure
+    # it exists without blocking the event loop on its creation
+    await firestore_client.aget()
+    return await (await app_handler.aget()).handle(req)
+
+
+@api.before_server_start
+async def init_services(app: Sanic, *_):
+    """
+    Attach the service container to the app. Clients are created on first use,
+    so a cold start doesn't wait on credentials, Weaviate or the chains.
+    """
+    app.ctx.services = services
+    # only registers the Slack controllers, without any network calls
+    slack_app.get()
+
+
+@api.after_server_start
+async def start_workers(*_):
+    "Start the workers that answer questions admitted through the REST API"
+    (await admission_controller.aget()).start()
+
+
+@api.after_server_start
+async def warm_up(app: Sanic, *_):
+    """
+    Warm up the connections to every dependency in the background. /ready
+    responds with a 503 until it's done, so no traffic is routed here before.
+    """
+    if WarmupConfig.enabled:
+        app.add_task(
+            readiness.run(WarmupConfig.timeout_seconds, WarmupConfig.retry_seconds),
+            name="warm_up",
+        )
+    else:
+        readiness.mark_ready()
+
+
+@api.before_server_stop
+async def stop_workers(*_):
+    "Stop the question workers before the server shuts down"
+    await admission_controller.stop()
+    # commit the request writes still waiting to be flushed
+    if request_store.initialized:
+        await request_store.close()
+
+
+@api.after_server_stop
+async def close_clients(*_):
+    "Close the shared HTTP connection pool on shutdown"
+    await close_http_session()
 
 
 server_port = int(os.environ.get("PORT", 8080))
 
-register_controllers(slack_app)
 register_routes(api)
 
+# compress JSON and text responses that are large enough
+api.on_response(compress_response)
+
 if __name__ == "__main__":
     api.run(host="0.0.0.0", port=server_port)
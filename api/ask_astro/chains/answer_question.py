@@ -1,52 +1,154 @@
-from ask_astro.clients.weaviate_ import docsearch
-from ask_astro.config import AzureOpenAIParams
+import os
+import re
+
+from ask_astro.chains.compressors import ContextPacker, LexicalReranker
+from ask_astro.chains.retrievers import AsyncMultiQueryRetriever
+from ask_astro.clients.azure_openai import azure_chat_model
+from ask_astro.clients.weaviate_ import docsearch, embeddings
+from ask_astro.container import Lazy
+from ask_astro.config import (
+    ContextPackingConfig,
+    ModelRouterConfig,
+    RerankConfig,
+    WeaviateConfig,
+)
+from ask_astro.services.streams import STREAMED_LLM_TAG
 from langchain import LLMChain
 from langchain.chains import ConversationalRetrievalChain
 from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
 from langchain.chains.question_answering import load_qa_chain
 from langchain.chat_models import AzureChatOpenAI
+from langchain.schema import BaseMessage
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain.retrievers.document_compressors import DocumentCompressorPipeline
 from langchain.prompts import (
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate,
     ChatPromptTemplate,
     MessagesPlaceholder,
 )
-from langchain.retrievers import MultiQueryRetriever
-
-with open("ask_astro/templates/combine_docs_chat_prompt.txt", "r") as system_prompt_fd:
-    messages = [
-        SystemMessagePromptTemplate.from_template(system_prompt_fd.read()),
-        MessagesPlaceholder(variable_name="messages"),
-        HumanMessagePromptTemplate.from_template("{question}"),
-    ]
-
-retriever = MultiQueryRetriever.from_llm(
-    llm=AzureChatOpenAI(
-        **AzureOpenAIParams.us_east,
-        deployment_name="gpt-35-turbo",
-        temperature=0,
-    ),
-    retriever=docsearch.as_retriever(),
-)
 
-answer_question_chain = ConversationalRetrievalChain(
-    retriever=retriever,
-    return_source_documents=True,
-    question_generator=LLMChain(
-        llm=AzureChatOpenAI(
-            **AzureOpenAIParams.us_east,
-            deployment_name="gpt-35-turbo-16k",
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+DEFAULT_ROUTE = "gpt-4-32k"
+SIMPLE_ROUTE = "gpt-35-turbo-16k"
+
+
+def build_retriever() -> ContextualCompressionRetriever:
+    "Builds the retriever shared by all answering chains."
+    # fetch the object ids so results can be deduplicated across queries, and the
+    # vectors if the reranker needs them
+    vector_retriever = docsearch.get().as_retriever(
+        search_kwargs={
+            "additional": ["id", "vector"] if RerankConfig.vector_weight else ["id"]
+        }
+    )
+
+    if WeaviateConfig.multi_query_enabled:
+        base_retriever = AsyncMultiQueryRetriever.from_llm(
+            llm=azure_chat_model(
+                "gpt-35-turbo",
+                temperature=0,
+            ),
+            retriever=vector_retriever,
+        )
+    else:
+        base_retriever = vector_retriever
+
+    # post-process the retrieved documents before they're stuffed into the prompt
+    return ContextualCompressionRetriever(
+        base_retriever=base_retriever,
+        base_compressor=DocumentCompressorPipeline(
+            transformers=[
+                LexicalReranker(
+                    top_n=RerankConfig.top_n,
+                    vector_weight=RerankConfig.vector_weight,
+                    embeddings=embeddings.get(),
+                ),
+                ContextPacker(
+                    token_budget=ContextPackingConfig.token_budget,
+                    duplicate_threshold=ContextPackingConfig.duplicate_threshold,
+                ),
+            ]
+        ),
+    )
+
+
+def build_answer_question_chains() -> dict[str, ConversationalRetrievalChain]:
+    """
+    Builds the chains that requests can be routed to, keyed by combine-docs
+    model. They share the retriever and the question generator.
+    """
+    with open(
+        os.path.join(TEMPLATES_DIR, "combine_docs_chat_prompt.txt"), "r"
+    ) as system_prompt_fd:
+        messages = [
+            SystemMessagePromptTemplate.from_template(system_prompt_fd.read()),
+            MessagesPlaceholder(variable_name="messages"),
+            HumanMessagePromptTemplate.from_template("{question}"),
+        ]
+
+    retriever = build_retriever()
+    question_generator = LLMChain(
+        llm=azure_chat_model(
+            "gpt-35-turbo-16k",
             temperature=0.3,
         ),
         prompt=CONDENSE_QUESTION_PROMPT,
-    ),
-    combine_docs_chain=load_qa_chain(
-        AzureChatOpenAI(
-            **AzureOpenAIParams.us_east2,
-            deployment_name="gpt-4-32k",
-            temperature=0.5,
-        ),
-        chain_type="stuff",
-        prompt=ChatPromptTemplate.from_messages(messages),
-    ),
+    )
+
+    def make_answer_question_chain(
+        llm: AzureChatOpenAI,
+    ) -> ConversationalRetrievalChain:
+        "Builds the answering chain, using the given LLM to combine the documents."
+        return ConversationalRetrievalChain(
+            retriever=retriever,
+            return_source_documents=True,
+            question_generator=question_generator,
+            combine_docs_chain=load_qa_chain(
+                llm,
+                chain_type="stuff",
+                prompt=ChatPromptTemplate.from_messages(messages),
+            ),
+        )
+
+    return {
+        route: make_answer_question_chain(
+            azure_chat_model(
+                route,
+                temperature=0.5,
+                streaming=True,
+                tags=[STREAMED_LLM_TAG],
+            )
+        )
+        for route in (DEFAULT_ROUTE, SIMPLE_ROUTE)
+    }
+
+
+answer_question_chains: Lazy[dict[str, ConversationalRetrievalChain]] = Lazy(
+    "answer_question_chains", build_answer_question_chains
+)
+
+# signs that a question needs the stronger model, e.g. pasted code or logs
+COMPLEX_QUESTION_MARKERS = re.compile(
+    r"```|Traceback|Exception|Error\b|\bdebug|\bcompare|\bdifference|\bwhy\b",
+    re.IGNORECASE,
 )
+
+
+def route_question(prompt: str, messages: list[BaseMessage]) -> str:
+    """
+    Picks the combine-docs model for a question with a local heuristic. Short,
+    standalone questions go to the faster model; multi-turn, long or technical
+    ones (code, stack traces, comparisons) stay on the default model.
+    """
+    if not ModelRouterConfig.enabled or messages:
+        return DEFAULT_ROUTE
+
+    if len(prompt.split()) > ModelRouterConfig.max_simple_words:
+        return DEFAULT_ROUTE
+
+    if COMPLEX_QUESTION_MARKERS.search(prompt):
+        return DEFAULT_ROUTE
+
+    return SIMPLE_ROUTE
@@ -0,0 +1,200 @@
+"Document compressors applied between retrieval and the combine-docs chain."
+
+import math
+import re
+
+from collections import Counter
+from typing import Sequence
+
+import numpy as np
+
+from langchain.callbacks.manager import Callbacks
+from langchain.embeddings.base import Embeddings
+from langchain.retrievers.document_compressors.base import BaseDocumentCompressor
+from langchain.schema import Document
+
+from ask_astro.clients.tokenizers import get_encoding
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+def shingles(text: str, size: int) -> set[tuple[str, ...]]:
+    "Returns the set of word n-grams of the text."
+    words = text.lower().split()
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def min_max(scores: np.ndarray) -> np.ndarray:
+    "Scales scores to [0, 1] so that differently ranged scores can be blended."
+    spread = scores.max() - scores.min()
+    if spread == 0:
+        return np.zeros_like(scores)
+    return (scores - scores.min()) / spread
+
+
+def bm25_scores(
+    query: str, documents: Sequence[Document], k1: float, b: float
+) -> np.ndarray:
+    "Scores the documents against the query with Okapi BM25 over the candidates."
+    doc_terms = [Counter(tokenize(doc.page_content)) for doc in documents]
+    doc_lengths = np.array([sum(terms.values()) for terms in doc_terms], dtype=float)
+    avg_length = doc_lengths.mean() or 1.0
+
+    scores = np.zeros(len(documents))
+    for term in set(tokenize(query)):
+        frequencies = np.array([terms[term] for terms in doc_terms], dtype=float)
+        n_containing = np.count_nonzero(frequencies)
+        if not n_containing:
+            continue
+
+        idf = math.log(1 + (len(documents) - n_containing + 0.5) / (n_containing + 0.5))
+        scores += idf * (
+            frequencies
+            * (k1 + 1)
+            / (frequencies + k1 * (1 - b + b * doc_lengths / avg_length))
+        )
+    return scores
+
+
+class LexicalReranker(BaseDocumentCompressor):
+    """
+    Reranks the retrieved candidates locally with BM25, optionally blended with
+    the cosine similarity between the query and document embeddings, and keeps
+    the `top_n` best. Document vectors are taken out of the `_additional.vector`
+    metadata returned by Weaviate, and the query vector from the (cached)
+    embeddings, so reranking doesn't add a network call per document.
+    """
+
+    top_n: int
+    vector_weight: float = 0.0
+    embeddings: Embeddings | None = None
+    k1: float = 1.5
+    b: float = 0.75
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def rerank(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        query_vector: list[float] | None = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+
+        scores = min_max(bm25_scores(query, documents, self.k1, self.b))
+
+        # the vectors are only needed here, so they're dropped from the metadata
+        # rather than carried into the prompt's logs and traces
+        doc_vectors = [
+            doc.metadata.get("_additional", {}).pop("vector", None) for doc in documents
+        ]
+        if (
+            self.vector_weight
+            and query_vector is not None
+            and all(v is not None for v in doc_vectors)
+        ):
+            matrix = np.asarray(doc_vectors, dtype=float)
+            vector = np.asarray(query_vector, dtype=float)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+            cosine = matrix @ vector / np.where(norms == 0, 1.0, norms)
+            scores = (1 - self.vector_weight) * scores + self.vector_weight * min_max(
+                cosine
+            )
+
+        order = np.argsort(-scores, kind="stable")[: self.top_n]
+        return [documents[i] for i in order]
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Callbacks | None = None,
+    ) -> Sequence[Document]:
+        query_vector = None
+        if self.vector_weight and self.embeddings is not None:
+            query_vector = self.embeddings.embed_query(query)
+        return self.rerank(documents, query, query_vector)
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Callbacks | None = None,
+    ) -> Sequence[Document]:
+        query_vector = None
+        if self.vector_weight and self.embeddings is not None:
+            query_vector = await self.embeddings.aembed_query(query)
+        return self.rerank(documents, query, query_vector)
+
+
+class ContextPacker(BaseDocumentCompressor):
+    """
+    Packs documents into the prompt, in the order they are ranked, until the
+    token budget is used up. Documents that are near-duplicates of one already
+    packed are dropped. Documents are passed through unchanged, so their metadata
+    (e.g. `docLink`) is preserved.
+    """
+
+    token_budget: int
+    encoding_name: str = "cl100k_base"
+    duplicate_threshold: float = 0.85
+    shingle_size: int = 5
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Callbacks | None = None,
+    ) -> Sequence[Document]:
+        encoding = get_encoding(self.encoding_name)
+
+        packed: list[Document] = []
+        packed_shingles: list[set] = []
+        used_tokens = 0
+        for doc in documents:
+            doc_shingles = shingles(doc.page_content, self.shingle_size)
+            if any(
+                jaccard(doc_shingles, other) >= self.duplicate_threshold
+                for other in packed_shingles
+            ):
+                continue
+
+            tokens = len(encoding.encode(doc.page_content))
+            if used_tokens + tokens > self.token_budget:
+                continue
+
+            packed.append(doc)
+            packed_shingles.append(doc_shingles)
+            used_tokens += tokens
+
+        logger.info(
+            "Packed %d of %d documents into %d tokens",
+            len(packed),
+            len(documents),
+            used_tokens,
+        )
+        return packed
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Callbacks | None = None,
+    ) -> Sequence[Document]:
+        return self.compress_documents(documents, query, callbacks)
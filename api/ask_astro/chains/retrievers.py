@@ -0,0 +1,127 @@
+"Retrievers used by the question answering chain."
+import asyncio
+import time
+
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain.retrievers import MultiQueryRetriever
+from langchain.schema import Document
+
+from ask_astro.clients.embeddings import CachedEmbeddings
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+def document_key(doc: Document) -> str:
+    "Identifies a document by its Weaviate object id, falling back to its link."
+    return (
+        doc.metadata.get("_additional", {}).get("id")
+        or doc.metadata.get("docLink")
+        or doc.page_content
+    )
+
+
+def reciprocal_rank_fusion(
+    results: list[list[Document]], k: int = 60
+) -> list[Document]:
+    """
+    Merges several ranked result lists into one, scoring each unique document by
+    the sum of 1 / (k + rank) over the lists it appears in.
+    """
+    scores: dict[str, float] = {}
+    documents: dict[str, Document] = {}
+    for docs in results:
+        for rank, doc in enumerate(docs):
+            key = document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class AsyncMultiQueryRetriever(MultiQueryRetriever):
+    """
+    MultiQueryRetriever that can run natively on the event loop. The upstream
+    implementation only supports synchronous retrieval.
+
+    All generated queries are sent to the underlying retriever concurrently, and
+    their results are merged with reciprocal rank fusion.
+    """
+
+    rrf_k: int = 60
+
+    async def agenerate_queries(
+        self, question: str, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[str]:
+        response = await self.llm_chain.acall(
+            {"question": question}, callbacks=run_manager.get_child()
+        )
+        lines = getattr(response["text"], self.parser_key, [])
+        if self.verbose:
+            logger.info("Generated queries: %s", lines)
+        return lines
+
+    async def aretrieve_documents(
+        self, queries: list[str], run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[list[Document]]:
+        "Runs all queries concurrently, returning one result list per query."
+
+        async def retrieve(query: str) -> list[Document]:
+            start = time.perf_counter()
+            docs = await self.retriever.aget_relevant_documents(
+                query, callbacks=run_manager.get_child()
+            )
+            logger.info(
+                "Retrieved %d documents in %.0fms for query %r",
+                len(docs),
+                (time.perf_counter() - start) * 1000,
+                query,
+            )
+            return docs
+
+        return await asyncio.gather(*(retrieve(query) for query in queries))
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+    ) -> list[Document]:
+        queries = self.generate_queries(query, run_manager)
+        results = [
+            self.retriever.get_relevant_documents(
+                query, callbacks=run_manager.get_child()
+            )
+            for query in queries
+        ]
+        return reciprocal_rank_fusion(results, k=self.rrf_k)
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+    ) -> list[Document]:
+        queries = await self.agenerate_queries(query, run_manager)
+
+        # embed all queries in one batched call, so that the concurrent searches
+        # below find their vectors in the embedding cache
+        vectorstore = getattr(self.retriever, "vectorstore", None)
+        if vectorstore is not None and isinstance(
+            vectorstore.embeddings, CachedEmbeddings
+        ):
+            await vectorstore.embeddings.aprefetch(queries)
+
+        start = time.perf_counter()
+        results = await self.aretrieve_documents(queries, run_manager)
+        logger.info(
+            "Retrieved documents for %d queries in %.0fms",
+            len(queries),
+            (time.perf_counter() - start) * 1000,
+        )
+
+        return reciprocal_rank_fusion(results, k=self.rrf_k)
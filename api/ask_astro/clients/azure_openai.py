@@ -0,0 +1,251 @@
+"""
+Balances Azure OpenAI calls across all configured regions, failing over to the
+healthiest endpoint when one is throttled or erroring.
+"""
+import time
+
+from dataclasses import dataclass
+from typing import Any
+
+import openai
+import openai.error
+
+from langchain.chat_models import AzureChatOpenAI
+from langchain.embeddings import OpenAIEmbeddings
+
+from ask_astro.config import AzureOpenAIParams
+from ask_astro.container import Lazy
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# maps the langchain model parameters to the openai client parameters
+CLIENT_PARAMS = {
+    "openai_api_key": "api_key",
+    "openai_api_base": "api_base",
+    "openai_api_version": "api_version",
+    "openai_api_type": "api_type",
+}
+
+# weight of the newest observation in the rolling latency and error rate
+EWMA_WEIGHT = 0.2
+
+# how long to avoid an endpoint that failed without sending a Retry-After header
+DEFAULT_COOLDOWN_SECONDS = 10.0
+
+
+@dataclass
+class Endpoint:
+    "A deployment in one region, along with its recent health."
+    region: str
+    deployment: str
+    params: dict[str, Any]
+    latency: float = 0.0
+    error_rate: float = 0.0
+    cooldown_until: float = 0.0
+    calls: int = 0
+    errors: int = 0
+
+    @property
+    def client_params(self) -> dict[str, Any]:
+        return {
+            CLIENT_PARAMS[key]: value
+            for key, value in self.params.items()
+            if key in CLIENT_PARAMS
+        } | {"engine": self.deployment}
+
+    @property
+    def score(self) -> float:
+        "Lower is healthier. Endpoints without calls yet score 0, so get tried."
+        return self.latency * (1 + 10 * self.error_rate)
+
+    def record_success(self, latency: float):
+        self.calls += 1
+        self.latency += EWMA_WEIGHT * (latency - self.latency)
+        self.error_rate -= EWMA_WEIGHT * self.error_rate
+
+    def record_failure(self, retry_after: float | None):
+        self.calls += 1
+        self.errors += 1
+        self.error_rate += EWMA_WEIGHT * (1 - self.error_rate)
+        self.cooldown_until = time.monotonic() + (
+            retry_after if retry_after is not None else DEFAULT_COOLDOWN_SECONDS
+        )
+
+
+def is_retryable(exc: Exception) -> bool:
+    "Whether the call should fail over to another endpoint."
+    if isinstance(
+        exc,
+        (
+            openai.error.RateLimitError,
+            openai.error.ServiceUnavailableError,
+            openai.error.Timeout,
+            openai.error.APIConnectionError,
+        ),
+    ):
+        return True
+    return isinstance(exc, openai.error.APIError) and (exc.http_status or 0) >= 500
+
+
+def retry_after(exc: Exception) -> float | None:
+    "Reads the Retry-After header of a failed call, in seconds."
+    headers = {
+        key.lower(): value
+        for key, value in (getattr(exc, "headers", None) or {}).items()
+    }
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class AzureOpenAIPool:
+    "Tracks the endpoints serving each deployment."
+
+    def __init__(self, regions: dict[str, dict[str, Any]]):
+        self.endpoints: dict[str, list[Endpoint]] = {}
+        for region, config in regions.items():
+            for deployment in config["deployments"]:
+                self.endpoints.setdefault(deployment, []).append(
+                    Endpoint(region=region, deployment=deployment, params=config)
+                )
+
+    def candidates(self, deployment: str) -> list[Endpoint]:
+        """
+        Returns the endpoints of a deployment, healthiest first. Endpoints that are
+        cooling down go last, ordered by when they become available again.
+        """
+        if deployment not in self.endpoints:
+            raise ValueError(f"No Azure OpenAI region serves deployment {deployment}")
+
+        now = time.monotonic()
+
+        def rank(endpoint: Endpoint) -> tuple[bool, float, float]:
+            # a past cooldown doesn't count against an endpoint that recovered
+            cooling_down = endpoint.cooldown_until > now
+            return (
+                cooling_down,
+                endpoint.cooldown_until if cooling_down else 0.0,
+                endpoint.score,
+            )
+
+        return sorted(self.endpoints[deployment], key=rank)
+
+    def default_params(self, deployment: str) -> dict[str, Any]:
+        "The model parameters of any endpoint serving the deployment."
+        return {
+            key: value
+            for key, value in self.endpoints[deployment][0].params.items()
+            if key != "deployments"
+        }
+
+    def stats(self) -> dict[str, list[dict[str, Any]]]:
+        return {
+            deployment: [
+                {
+                    "region": e.region,
+                    "latency_ms": round(e.latency * 1000),
+                    "error_rate": round(e.error_rate, 3),
+                    "calls": e.calls,
+                    "errors": e.errors,
+                }
+                for e in endpoints
+            ]
+            for deployment, endpoints in self.endpoints.items()
+        }
+
+
+class BalancedClient:
+    """
+    Stands in for `openai.ChatCompletion` / `openai.Embedding` on a langchain
+    model. Each call goes to the healthiest endpoint of the deployment, and fails
+    over to the next one on throttling, timeouts and 5xx errors.
+    """
+
+    def __init__(self, client: Any, pool: AzureOpenAIPool, deployment: str):
+        self.client = client
+        self.pool = pool
+        self.deployment = deployment
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    async def acreate(self, **kwargs: Any) -> Any:
+        error = None
+        for endpoint in self.pool.candidates(self.deployment):
+            start = time.monotonic()
+            try:
+                result = await self.client.acreate(
+                    **{**kwargs, **endpoint.client_params}
+                )
+            except Exception as exc:
+                if not is_retryable(exc):
+                    raise
+                error = self.fail_over(endpoint, exc)
+                continue
+
+            endpoint.record_success(time.monotonic() - start)
+            return result
+        raise error
+
+    def create(self, **kwargs: Any) -> Any:
+        error = None
+        for endpoint in self.pool.candidates(self.deployment):
+            start = time.monotonic()
+            try:
+                result = self.client.create(**{**kwargs, **endpoint.client_params})
+            except Exception as exc:
+                if not is_retryable(exc):
+                    raise
+                error = self.fail_over(endpoint, exc)
+                continue
+
+            endpoint.record_success(time.monotonic() - start)
+            return result
+        raise error
+
+    def fail_over(self, endpoint: Endpoint, exc: Exception) -> Exception:
+        endpoint.record_failure(retry_after(exc))
+        logger.warning(
+            "Azure OpenAI %s in %s failed, failing over: %s",
+            self.deployment,
+            endpoint.region,
+            exc,
+        )
+        return exc
+
+
+azure_openai_pool: Lazy[AzureOpenAIPool] = Lazy(
+    "azure_openai_pool", lambda: AzureOpenAIPool(AzureOpenAIParams.regions)
+)
+
+
+def azure_chat_model(deployment_name: str, **kwargs: Any) -> AzureChatOpenAI:
+    "Returns a chat model whose calls are balanced across regions."
+    llm = AzureChatOpenAI(
+        **azure_openai_pool.default_params(deployment_name),
+        deployment_name=deployment_name,
+        **kwargs,
+    )
+    llm.client = BalancedClient(llm.client, azure_openai_pool.get(), deployment_name)
+    return llm
+
+
+def azure_embeddings_model(deployment: str, **kwargs: Any) -> OpenAIEmbeddings:
+    "Returns an embeddings model whose calls are balanced across regions."
+    embeddings = OpenAIEmbeddings(
+        **azure_openai_pool.default_params(deployment),
+        deployment=deployment,
+        model=deployment,
+        **kwargs,
+    )
+    embeddings.client = BalancedClient(
+        embeddings.client, azure_openai_pool.get(), deployment
+    )
+    return embeddings
@@ -0,0 +1,191 @@
+"Embeddings wrapper that caches vectors in memory and on disk"
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+from langchain.embeddings.base import Embeddings
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    "Normalizes text so that trivially different queries share a cache entry."
+    return " ".join(text.split()).casefold()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model with an in-process LRU, backed by a SQLite store that
+    survives restarts. Entries are keyed by the model and the normalized text, and
+    cache misses are embedded in a single batched call. The async methods read
+    and write the SQLite store off the event loop.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        *,
+        model: str,
+        path: str,
+        max_entries: int,
+    ):
+        self.underlying = underlying
+        self.model = model
+        self.max_entries = max_entries
+        self.memory: OrderedDict[str, list[float]] = OrderedDict()
+        # keys embedded ahead of the lookup that will use them, see `aprefetch`
+        self.prefetched: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        # the store is shared by the event loop and the threads that read it
+        self.db_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+        )
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{normalize(text)}".encode()).hexdigest()
+
+    def remember(self, key: str, vector: list[float]):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            key, _ = self.memory.popitem(last=False)
+            self.prefetched.discard(key)
+
+    def read(self, keys: list[str]) -> dict[str, list[float]]:
+        "Reads the vectors of the given keys from disk."
+        if not keys:
+            return {}
+        with self.db_lock:
+            rows = self.db.execute(
+                "SELECT key, vector FROM embeddings WHERE key IN "
+                f"({','.join('?' * len(keys))})",
+                keys,
+            ).fetchall()
+        return {
+            key: np.frombuffer(blob, dtype=np.float64).tolist() for key, blob in rows
+        }
+
+    def write(self, vectors: dict[str, list[float]]):
+        "Writes the vectors to disk."
+        rows = [
+            (key, np.asarray(vector, dtype=np.float64).tobytes())
+            for key, vector in vectors.items()
+        ]
+        with self.db_lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+
+    def remember_all(self, vectors: dict[str, list[float]]) -> dict[str, list[float]]:
+        for key, vector in vectors.items():
+            self.remember(key, vector)
+        return vectors
+
+    def count(self, keys: list[str], to_embed: dict[str, str], prefetch: bool):
+        """
+        Counts the hits and misses of a lookup. The lookup that reads a prefetched
+        vector isn't counted, since the prefetch already counted it.
+        """
+        missed = set()
+        for key in keys:
+            if prefetch:
+                self.prefetched.add(key)
+            elif key in self.prefetched:
+                self.prefetched.discard(key)
+                continue
+            # repeated texts are only embedded once
+            if key in to_embed and key not in missed:
+                missed.add(key)
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def partition(
+        self, texts: list[str]
+    ) -> tuple[list[str], dict[str, list[float]], list[str]]:
+        """
+        Returns the keys of the texts, the vectors cached in memory, and the keys
+        to look up on disk.
+        """
+        keys = [self.key(text) for text in texts]
+        found = {}
+        for key in keys:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                found[key] = self.memory[key]
+        return keys, found, [key for key in set(keys) if key not in found]
+
+    def finish_lookup(
+        self,
+        keys: list[str],
+        texts: list[str],
+        found: dict[str, list[float]],
+        prefetch: bool,
+    ) -> dict[str, str]:
+        "Counts the lookup, and returns the unique texts that still need embedding."
+        to_embed = {key: text for key, text in zip(keys, texts) if key not in found}
+        self.count(keys, to_embed, prefetch)
+        return to_embed
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = self.partition(texts)
+        found.update(self.remember_all(self.read(missing)))
+        to_embed = self.finish_lookup(keys, texts, found, prefetch=False)
+        if to_embed:
+            vectors = self.underlying.embed_documents(list(to_embed.values()))
+            vectors = self.remember_all(dict(zip(to_embed, vectors)))
+            self.write(vectors)
+            found.update(vectors)
+        return [found[key] for key in keys]
+
+    async def aembed_documents(
+        self, texts: list[str], prefetch: bool = False
+    ) -> list[list[float]]:
+        keys, found, missing = self.partition(texts)
+        if missing:
+            found.update(self.remember_all(await asyncio.to_thread(self.read, missing)))
+        to_embed = self.finish_lookup(keys, texts, found, prefetch)
+        if to_embed:
+            vectors = await self.underlying.aembed_documents(list(to_embed.values()))
+            vectors = self.remember_all(dict(zip(to_embed, vectors)))
+            await asyncio.to_thread(self.write, vectors)
+            found.update(vectors)
+        return [found[key] for key in keys]
+
+    async def aprefetch(self, texts: list[str]):
+        """
+        Embeds the texts ahead of the lookups that will use them, e.g. to embed
+        several queries in one batched call. Those lookups aren't counted again.
+        """
+        await self.aembed_documents(texts, prefetch=True)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> dict[str, int | float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.memory),
+        }
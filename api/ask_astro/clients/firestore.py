@@ -2,7 +2,17 @@
 
 from google.cloud import firestore
 
-# auth is handled implicitly by the environment
-firestore_client = firestore.AsyncClient()
+from ask_astro.container import Lazy
 
-__all__ = ["firestore_client"]
+# auth is handled implicitly by the environment. Shared by every store, and only
+# created on first use, since resolving the credentials can take a while.
+firestore_client: Lazy[firestore.AsyncClient] = Lazy(
+    "firestore_client", firestore.AsyncClient
+)
+
+# snapshot listeners are only supported by the synchronous client
+firestore_sync_client: Lazy[firestore.Client] = Lazy(
+    "firestore_sync_client", firestore.Client
+)
+
+__all__ = ["firestore_client", "firestore_sync_client"]
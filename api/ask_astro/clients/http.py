@@ -0,0 +1,32 @@
+"Shared aiohttp session for outbound HTTP calls (Azure OpenAI, Weaviate)"
+
+import aiohttp
+
+from ask_astro.config import HttpConfig
+
+_session: aiohttp.ClientSession | None = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Returns the pooled session shared by all outbound calls, creating it on
+    first use. Must be called from within the running event loop.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HttpConfig.pool_size),
+            timeout=aiohttp.ClientTimeout(total=HttpConfig.timeout_seconds),
+        )
+    return _session
+
+
+async def close_http_session():
+    "Closes the shared session, if it was ever opened."
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+__all__ = ["get_http_session", "close_http_session"]
@@ -1,3 +1,5 @@
 from langsmith import Client
 
-langsmith_client = Client()
+from ask_astro.container import Lazy
+
+langsmith_client: Lazy[Client] = Lazy("langsmith_client", Client)
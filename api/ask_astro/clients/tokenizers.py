@@ -0,0 +1,81 @@
+"""
+Loads tiktoken encodings from a local cache instead of downloading them on first use.
+
+The cache is populated when the API image is built:
+
+    python -m ask_astro.clients.tokenizers
+"""
+import argparse
+import functools
+import hashlib
+import os
+
+import tiktoken
+
+from ask_astro.config import TokenizerConfig
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# the files tiktoken downloads for each encoding we use
+ENCODING_FILES = {
+    "cl100k_base": [
+        "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+    ],
+    "p50k_base": [
+        "https://openaipublic.blob.core.windows.net/encodings/p50k_base.tiktoken"
+    ],
+}
+
+
+def use_local_cache():
+    """
+    Points tiktoken at the local cache, unless TIKTOKEN_CACHE_DIR is already set.
+    Must run before the first encoding is loaded, including by langchain.
+    """
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", TokenizerConfig.cache_dir)
+
+
+def cache_path(url: str) -> str:
+    "Where tiktoken caches the file downloaded from the url."
+    return os.path.join(
+        os.environ["TIKTOKEN_CACHE_DIR"], hashlib.sha1(url.encode()).hexdigest()
+    )
+
+
+def is_cached(encoding_name: str) -> bool:
+    urls = ENCODING_FILES.get(encoding_name)
+    return urls is not None and all(os.path.exists(cache_path(url)) for url in urls)
+
+
+@functools.lru_cache
+def get_encoding(encoding_name: str) -> tiktoken.Encoding:
+    """
+    Returns the encoding from the local cache. In offline mode, an encoding that
+    isn't cached raises right away instead of blocking on the network.
+    """
+    use_local_cache()
+    if TokenizerConfig.offline and not is_cached(encoding_name):
+        raise FileNotFoundError(
+            f"Encoding {encoding_name} isn't in {os.environ['TIKTOKEN_CACHE_DIR']}, "
+            "run `python -m ask_astro.clients.tokenizers` to download it"
+        )
+    return tiktoken.get_encoding(encoding_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downloads tiktoken encodings")
+    parser.add_argument("encodings", nargs="*", default=TokenizerConfig.encodings)
+    args = parser.parse_args()
+
+    use_local_cache()
+    for encoding_name in args.encodings:
+        tiktoken.get_encoding(encoding_name)
+        print(f"Cached {encoding_name} in {os.environ['TIKTOKEN_CACHE_DIR']}")
+
+
+use_local_cache()
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,122 @@
+from typing import Any
+
 import weaviate
 from weaviate import Client as WeaviateClient
-from ask_astro.config import AzureOpenAIParams, WeaviateConfig
-from langchain.embeddings import OpenAIEmbeddings
+from ask_astro.config import EmbeddingCacheConfig, WeaviateConfig
+from ask_astro.clients.azure_openai import azure_embeddings_model
+from ask_astro.clients.embeddings import CachedEmbeddings
+from ask_astro.clients.http import get_http_session
+from ask_astro.container import Lazy
+from langchain.schema import Document
 from langchain.vectorstores import Weaviate
 
-embeddings = OpenAIEmbeddings(
-    **AzureOpenAIParams.us_east,
-    deployment="text-embedding-ada-002",
-    model="text-embedding-ada-002",
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+embeddings: Lazy[CachedEmbeddings] = Lazy(
+    "embeddings",
+    lambda: CachedEmbeddings(
+        azure_embeddings_model("text-embedding-ada-002"),
+        model="text-embedding-ada-002",
+        path=EmbeddingCacheConfig.path,
+        max_entries=EmbeddingCacheConfig.max_entries,
+    ),
 )
 
-client = WeaviateClient(
-    url=WeaviateConfig.url,
-    auth_client_secret=weaviate.AuthApiKey(api_key=WeaviateConfig.api_key),
-    additional_headers={
-        "X-Openai-Api-Key": WeaviateConfig.OpenAIApiKey,
-    },
+# the client checks that Weaviate is up when it's created, so defer it
+client: Lazy[WeaviateClient] = Lazy(
+    "weaviate_client",
+    lambda: WeaviateClient(
+        url=WeaviateConfig.url,
+        auth_client_secret=weaviate.AuthApiKey(api_key=WeaviateConfig.api_key),
+        additional_headers={
+            "X-Openai-Api-Key": WeaviateConfig.OpenAIApiKey,
+        },
+    ),
 )
-docsearch = Weaviate(
-    client=client,
-    index_name=WeaviateConfig.index_name,
-    text_key=WeaviateConfig.text_key,
-    attributes=WeaviateConfig.attributes,
+
+
+class AsyncWeaviate(Weaviate):
+    """
+    Weaviate vector store whose async searches are sent over the shared aiohttp
+    session, instead of blocking an executor thread on the synchronous client.
+
+    Queries are embedded on the client through the embedding cache and sent as
+    `nearVector`, so Weaviate doesn't have to call OpenAI to vectorize them.
+
+    In hybrid mode, each query is sent as a single `hybrid` query that blends
+    BM25 over the text with the vector search, weighted by `hybrid_alpha`.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        search_mode: str = "vector",
+        hybrid_alpha: float = 0.5,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        if search_mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unknown Weaviate search mode: {search_mode}")
+        self.search_mode = search_mode
+        self.hybrid_alpha = hybrid_alpha
+
+    async def _araw(self, gql_query: str) -> dict[str, Any]:
+        "Async equivalent of `client.query.raw`."
+        connection = self._client._connection
+        async with get_http_session().post(
+            f"{connection.url}/v1/graphql",
+            json={"query": gql_query},
+            headers=connection._get_request_header(),
+        ) as response:
+            response.raise_for_status()
+            result = await response.json()
+
+        if result.get("errors"):
+            raise ValueError(f"Error during query: {result['errors']}")
+        return result
+
+    def _to_documents(self, result: dict[str, Any]) -> list[Document]:
+        docs = []
+        for res in result["data"]["Get"][self._index_name]:
+            text = res.pop(self._text_key)
+            docs.append(Document(page_content=text, metadata=res))
+        return docs
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        query_obj = self._client.query.get(self._index_name, self._query_attrs)
+        if kwargs.get("where_filter"):
+            query_obj = query_obj.with_where(kwargs.get("where_filter"))
+        if kwargs.get("additional"):
+            query_obj = query_obj.with_additional(kwargs.get("additional"))
+
+        vector = await self._embedding.aembed_query(query)
+        logger.debug("Embedding cache stats: %s", self._embedding.stats())
+
+        if self.search_mode == "hybrid":
+            query_obj = query_obj.with_hybrid(
+                query=query, alpha=self.hybrid_alpha, vector=vector
+            )
+        else:
+            query_obj = query_obj.with_near_vector({"vector": vector})
+
+        gql_query = query_obj.with_limit(k)
+        return self._to_documents(await self._araw(gql_query.build()))
+
+
+docsearch: Lazy[AsyncWeaviate] = Lazy(
+    "docsearch",
+    lambda: AsyncWeaviate(
+        client=client.get(),
+        index_name=WeaviateConfig.index_name,
+        text_key=WeaviateConfig.text_key,
+        attributes=WeaviateConfig.attributes,
+        embedding=embeddings.get(),
+        by_text=False,
+        search_mode=WeaviateConfig.search_mode,
+        hybrid_alpha=WeaviateConfig.hybrid_alpha,
+    ),
 )
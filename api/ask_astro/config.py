@@ -5,49 +5,307 @@
 import os
 import json
 
+from typing import Any, Callable
+
+_REQUIRED = object()
+
+
+class env:
+    """
+    A config variable read from the environment when it's accessed, rather than
+    when the module is imported, so that a missing variable only fails the code
+    that needs it. The parsed value is reused until the variable changes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        default: Any = _REQUIRED,
+        parse: Callable[[Any], Any] | None = None,
+    ):
+        self.name = name
+        self.default = default
+        self.parse = parse
+        # (raw value, parsed value) of the last access
+        self._parsed: tuple[Any, Any] | None = None
+
+    def __get__(self, obj: Any, owner: type) -> Any:
+        if self.name in os.environ:
+            value = os.environ[self.name]
+        elif self.default is _REQUIRED:
+            raise KeyError(f"Missing required environment variable {self.name}")
+        else:
+            value = self.default
+        if self.parse is None:
+            return value
+
+        if self._parsed is None or self._parsed[0] != value:
+            self._parsed = (value, self.parse(value))
+        return self._parsed[1]
+
+
+class computed:
+    "A config variable derived from others, computed when it's accessed."
+
+    def __init__(self, fn: Callable[[type], Any]):
+        self.fn = fn
+
+    def __get__(self, obj: Any, owner: type) -> Any:
+        return self.fn(owner)
+
+
+def as_bool(value: Any) -> bool:
+    return str(value).lower() == "true"
+
 
 class FirestoreCollections:
     "Contains the names of the collections in the Firestore database."
-    installation_store = os.environ["FIRESTORE_INSTALLATION_STORE_COLLECTION"]
-    state_store = os.environ["FIRESTORE_STATE_STORE_COLLECTION"]
-    messages = os.environ["FIRESTORE_MESSAGES_COLLECTION"]
-    mentions = os.environ["FIRESTORE_MENTIONS_COLLECTION"]
-    actions = os.environ["FIRESTORE_ACTIONS_COLLECTION"]
-    responses = os.environ["FIRESTORE_RESPONSES_COLLECTION"]
-    reactions = os.environ["FIRESTORE_REACTIONS_COLLECTION"]
-    shortcuts = os.environ["FIRESTORE_SHORTCUTS_COLLECTION"]
-    teams = os.environ["FIRESTORE_TEAMS_COLLECTION"]
-    requests = os.environ["FIRESTORE_REQUESTS_COLLECTION"]
+    installation_store = env("FIRESTORE_INSTALLATION_STORE_COLLECTION")
+    state_store = env("FIRESTORE_STATE_STORE_COLLECTION")
+    messages = env("FIRESTORE_MESSAGES_COLLECTION")
+    mentions = env("FIRESTORE_MENTIONS_COLLECTION")
+    actions = env("FIRESTORE_ACTIONS_COLLECTION")
+    responses = env("FIRESTORE_RESPONSES_COLLECTION")
+    reactions = env("FIRESTORE_REACTIONS_COLLECTION")
+    shortcuts = env("FIRESTORE_SHORTCUTS_COLLECTION")
+    teams = env("FIRESTORE_TEAMS_COLLECTION")
+    requests = env("FIRESTORE_REQUESTS_COLLECTION")
+    jobs = env("FIRESTORE_JOBS_COLLECTION", "jobs")
+    conversations = env("FIRESTORE_CONVERSATIONS_COLLECTION", "conversations")
+    feeds = env("FIRESTORE_FEEDS_COLLECTION", "feeds")
 
 
 class AzureOpenAIParams:
     "Contains the parameters for the Azure OpenAI API."
-    us_east = json.loads(os.environ["AZURE_OPENAI_USEAST_PARAMS"])
-    us_east2 = json.loads(os.environ["AZURE_OPENAI_USEAST2_PARAMS"])
+    us_east = env("AZURE_OPENAI_USEAST_PARAMS", parse=json.loads)
+    us_east2 = env("AZURE_OPENAI_USEAST2_PARAMS", parse=json.loads)
+    configured_regions = env(
+        "AZURE_OPENAI_REGIONS", "", parse=lambda value: json.loads(value or "null")
+    )
+
+    # every region, with its parameters and the deployments it serves
+    @computed
+    def regions(cls) -> dict[str, dict[str, Any]]:
+        if cls.configured_regions is not None:
+            return cls.configured_regions
+        return {
+            "us_east": {
+                **cls.us_east,
+                "deployments": [
+                    "gpt-35-turbo",
+                    "gpt-35-turbo-16k",
+                    "text-embedding-ada-002",
+                ],
+            },
+            "us_east2": {**cls.us_east2, "deployments": ["gpt-4-32k"]},
+        }
 
 
 class ZendeskConfig:
     "Contains the config variables for the Zendesk API."
-    credentials = os.environ.get("ZENDESK_CREDENTIALS")
-    assignee_group_id = os.environ["ZENDESK_ASSIGNEE_GROUP_ID"]
+    credentials = env("ZENDESK_CREDENTIALS", None)
+    assignee_group_id = env("ZENDESK_ASSIGNEE_GROUP_ID")
 
 
 class SlackAppConfig:
     "Contains the config variables for the Slack app."
-    client_id = os.environ["SLACK_CLIENT_ID"]
-    client_secret = os.environ["SLACK_CLIENT_SECRET"]
-    signing_secret = os.environ["SLACK_SIGNING_SECRET"]
+    client_id = env("SLACK_CLIENT_ID")
+    client_secret = env("SLACK_CLIENT_SECRET")
+    signing_secret = env("SLACK_SIGNING_SECRET")
+    # how long installation lookups are cached, and lookups of missing ones
+    installation_cache_ttl_seconds = env(
+        "SLACK_INSTALLATION_CACHE_TTL_SECONDS", 300, parse=float
+    )
+    installation_negative_cache_ttl_seconds = env(
+        "SLACK_INSTALLATION_NEGATIVE_CACHE_TTL_SECONDS", 30, parse=float
+    )
 
 
 class LangSmithConfig:
     "Contains the config variables for the Langsmith API."
-    project_name = os.environ["LANGCHAIN_PROJECT"]
+    project_name = env("LANGCHAIN_PROJECT")
 
 
 class WeaviateConfig:
-    OpenAIApiKey = os.environ["OPENAI_API_KEY"]
-    url = os.environ["WEAVIATE_URL"]
-    api_key = os.environ["WEAVIATE_API_KEY"]
-    index_name = os.environ["WEAVIATE_INDEX_NAME"]
-    text_key = os.environ["WEAVIATE_TEXT_KEY"]
-    attributes = os.environ.get("WEAVIATE_ATTRIBUTES", "").split(",")
+    OpenAIApiKey = env("OPENAI_API_KEY")
+    url = env("WEAVIATE_URL")
+    api_key = env("WEAVIATE_API_KEY")
+    index_name = env("WEAVIATE_INDEX_NAME")
+    text_key = env("WEAVIATE_TEXT_KEY")
+    attributes = env(
+        "WEAVIATE_ATTRIBUTES",
+        "",
+        parse=lambda value: [attribute for attribute in value.split(",") if attribute],
+    )
+    # "vector" for pure vector search, or "hybrid" to blend it with BM25
+    search_mode = env("WEAVIATE_SEARCH_MODE", "vector")
+    # weight of the vector search in hybrid mode: 0 is pure BM25, 1 pure vector
+    hybrid_alpha = env("WEAVIATE_HYBRID_ALPHA", 0.5, parse=float)
+
+    # hybrid search catches exact terms that the LLM rewrites were there for, so
+    # multi-query retrieval is off by default in hybrid mode
+    @computed
+    def multi_query_enabled(cls) -> bool:
+        return as_bool(
+            os.environ.get("MULTI_QUERY_ENABLED", str(cls.search_mode != "hybrid"))
+        )
+
+
+class SemanticCacheConfig:
+    "Contains the config variables for the semantic answer cache."
+    enabled = env("SEMANTIC_CACHE_ENABLED", "true", parse=as_bool)
+    similarity_threshold = env(
+        "SEMANTIC_CACHE_SIMILARITY_THRESHOLD", "0.95", parse=float
+    )
+    ttl_seconds = env("SEMANTIC_CACHE_TTL_SECONDS", 60 * 60 * 24, parse=int)
+    max_entries = env("SEMANTIC_CACHE_MAX_ENTRIES", 1000, parse=int)
+
+
+class HttpConfig:
+    "Contains the config variables for the shared outbound HTTP session."
+    pool_size = env("HTTP_POOL_SIZE", 100, parse=int)
+    timeout_seconds = env("HTTP_TIMEOUT_SECONDS", 120, parse=int)
+
+
+class AnswerConfig:
+    "Contains the config variables for answering questions."
+    max_concurrency = env("ANSWER_MAX_CONCURRENCY", 32, parse=int)
+    # whether identical questions asked at the same time share one chain run
+    coalesce_enabled = env("ANSWER_COALESCE_ENABLED", "true", parse=as_bool)
+    # how long a streamed request can take, queued and answered, before its
+    # stream is ended with an error
+    stream_timeout_seconds = env("ANSWER_STREAM_TIMEOUT_SECONDS", 600, parse=float)
+
+
+class EmbeddingCacheConfig:
+    "Contains the config variables for the query embedding cache."
+    path = env(
+        "EMBEDDING_CACHE_PATH",
+        os.path.join(os.path.expanduser("~"), ".cache", "ask_astro", "embeddings.db"),
+    )
+    max_entries = env("EMBEDDING_CACHE_MAX_ENTRIES", 10000, parse=int)
+
+
+class ContextPackingConfig:
+    "Contains the config variables for packing documents into the prompt."
+    token_budget = env("CONTEXT_TOKEN_BUDGET", 12000, parse=int)
+    duplicate_threshold = env("CONTEXT_DUPLICATE_THRESHOLD", 0.85, parse=float)
+
+
+class RerankConfig:
+    "Contains the config variables for reranking retrieved documents."
+    top_n = env("RERANK_TOP_N", 8, parse=int)
+    # weight of the embedding cosine similarity, blended with the BM25 score. 0
+    # ranks by BM25 alone, and doesn't fetch the document vectors.
+    vector_weight = env("RERANK_VECTOR_WEIGHT", 0.3, parse=float)
+
+
+class ModelRouterConfig:
+    "Contains the config variables for routing questions to combine-docs models."
+    enabled = env("MODEL_ROUTER_ENABLED", "true", parse=as_bool)
+    # questions with more words than this always go to the default model
+    max_simple_words = env("MODEL_ROUTER_MAX_SIMPLE_WORDS", 25, parse=int)
+
+
+class AdmissionConfig:
+    "Contains the config variables for admitting questions from the REST API."
+    max_queue_size = env("ADMISSION_MAX_QUEUE_SIZE", 100, parse=int)
+    workers = env("ADMISSION_WORKERS", 8, parse=int)
+
+
+class JobQueueConfig:
+    "Contains the config variables for the queue of questions to be answered."
+    # "memory", "sqlite" or "firestore"
+    backend = env("JOB_QUEUE_BACKEND", "memory")
+    sqlite_path = env(
+        "JOB_QUEUE_SQLITE_PATH",
+        os.path.join(os.path.expanduser("~"), ".cache", "ask_astro", "jobs.db"),
+    )
+    lease_seconds = env("JOB_QUEUE_LEASE_SECONDS", 60, parse=float)
+    max_attempts = env("JOB_QUEUE_MAX_ATTEMPTS", 3, parse=int)
+    poll_interval = env("JOB_QUEUE_POLL_INTERVAL", 1.0, parse=float)
+
+    # whether the API process answers questions itself, or leaves them to
+    # `python -m ask_astro.worker`. In-memory jobs can only be answered in process.
+    @computed
+    def embedded_workers(cls) -> bool:
+        return cls.backend == "memory" or as_bool(
+            os.environ.get("JOB_QUEUE_EMBEDDED_WORKERS", "true")
+        )
+
+
+class WarmupConfig:
+    "Contains the config variables for warming up connections at server start."
+    enabled = env("WARMUP_ENABLED", "true", parse=as_bool)
+    timeout_seconds = env("WARMUP_TIMEOUT_SECONDS", 30, parse=float)
+    # how long to wait before warming up again, when a dependency failed
+    retry_seconds = env("WARMUP_RETRY_SECONDS", 10, parse=float)
+
+
+class TokenizerConfig:
+    "Contains the config variables for the tiktoken encodings."
+    cache_dir = env(
+        "TOKENIZER_CACHE_DIR",
+        os.path.join(os.path.dirname(__file__), "tiktoken_cache"),
+    )
+    # the encodings downloaded into the cache when the image is built
+    encodings = env("TOKENIZER_ENCODINGS", "cl100k_base", parse=lambda v: v.split(","))
+    # whether to fail instead of downloading encodings that aren't cached
+    offline = env("TOKENIZER_OFFLINE", "false", parse=as_bool)
+
+
+class RequestStoreConfig:
+    "Contains the config variables for saving requests to Firestore."
+    # whether saves are batched and committed every `flush_interval` seconds
+    write_behind = env("REQUEST_STORE_WRITE_BEHIND", "false", parse=as_bool)
+    flush_interval = env("REQUEST_STORE_FLUSH_INTERVAL", 0.5, parse=float)
+
+
+class ConversationConfig:
+    "Contains the config variables for storing conversations."
+    # how many conversations to keep the turns of in memory
+    cache_size = env("CONVERSATION_CACHE_SIZE", 1000, parse=int)
+
+
+class LongPollConfig:
+    "Contains the config variables for waiting on requests to change."
+    # the longest a GET /requests/{request_id}?wait= is held open
+    max_wait_seconds = env("LONG_POLL_MAX_WAIT_SECONDS", 30, parse=float)
+    # whether to watch requests answered by other instances with snapshot listeners
+    listeners_enabled = env("LONG_POLL_LISTENERS_ENABLED", "true", parse=as_bool)
+    # each listener holds a thread and a stream to Firestore, so they're capped.
+    # beyond the cap, waits only see changes saved by this instance.
+    max_listeners = env("LONG_POLL_MAX_LISTENERS", 100, parse=int)
+
+
+class RequestCacheConfig:
+    "Contains the config variables for the cache of answered requests."
+    enabled = env("REQUEST_CACHE_ENABLED", "true", parse=as_bool)
+    # bounds how stale the score of a request is, when feedback is submitted to
+    # another instance
+    ttl_seconds = env("REQUEST_CACHE_TTL_SECONDS", 300, parse=int)
+    max_entries = env("REQUEST_CACHE_MAX_ENTRIES", 1000, parse=int)
+
+
+class ExampleFeedConfig:
+    "Contains the config variables for the feed of example requests."
+    # the document the find_example_runs DAG materializes the feed into
+    document = env("EXAMPLE_FEED_DOCUMENT", "examples")
+    size = env("EXAMPLE_FEED_SIZE", 12, parse=int)
+    # the most examples a page of GET /requests?limit= can have
+    max_page_size = env("EXAMPLE_FEED_MAX_PAGE_SIZE", 100, parse=int)
+    ttl_seconds = env("EXAMPLE_FEED_TTL_SECONDS", 300, parse=int)
+
+
+class CompressionConfig:
+    "Contains the config variables for compressing responses."
+    enabled = env("COMPRESSION_ENABLED", "true", parse=as_bool)
+    # smaller responses aren't worth the CPU, and barely shrink
+    min_size = env("COMPRESSION_MIN_SIZE", 1024, parse=int)
+    gzip_level = env("COMPRESSION_GZIP_LEVEL", 6, parse=int)
+    # higher qualities compress better, but are too slow for dynamic responses
+    brotli_quality = env("COMPRESSION_BROTLI_QUALITY", 4, parse=int)
+    # whether server-sent events are compressed, flushed after every event
+    streams_enabled = env("COMPRESSION_STREAMS_ENABLED", "true", parse=as_bool)
+    # how many compressed bodies of responses with an ETag to keep
+    cache_size = env("COMPRESSION_CACHE_SIZE", 256, parse=int)
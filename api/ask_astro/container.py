@@ -0,0 +1,98 @@
+"""
+Clients and services that are created on first use and shared by the whole app.
+
+Creating them at import time made cold starts slow (network calls, credential
+lookups, prompt files) and let a single missing env var crash the import.
+"""
+import asyncio
+import threading
+import time
+
+from typing import Any, Callable, Generic, TypeVar
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Stands in for a singleton that is created on first use. Attribute access is
+    forwarded to the instance, so call sites can keep using the module-level
+    name as if it were the instance itself. Use `get()` where the real instance
+    is needed, e.g. when it's validated by pydantic.
+
+    Creating an instance can block, e.g. on credential lookups, and another
+    thread may be creating it already. Coroutines that may be the first to use
+    it should `await aget()`, which waits off the event loop.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self._name = name
+        self._factory = factory
+        self._instance: T | None = None
+        self._lock = threading.Lock()
+        self.init_seconds: float | None = None
+        services.register(name, self)
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> T:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    self.init_seconds = time.perf_counter() - start
+                    logger.info(
+                        "Created %s in %.0fms", self._name, self.init_seconds * 1000
+                    )
+        return self._instance
+
+    async def aget(self) -> T:
+        if self._instance is None:
+            return await asyncio.to_thread(self.get)
+        return self._instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.get()[key]
+
+    def __repr__(self) -> str:
+        state = "initialized" if self.initialized else "not initialized"
+        return f"<Lazy {self._name} ({state})>"
+
+
+class ServiceContainer:
+    "Keeps track of the lazily created services, e.g. to report how long they took."
+
+    def __init__(self):
+        self.services: dict[str, Lazy] = {}
+
+    def register(self, name: str, service: Lazy):
+        self.services[name] = service
+
+    def __getitem__(self, name: str) -> Lazy:
+        return self.services[name]
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            name: {
+                "initialized": service.initialized,
+                "init_ms": (
+                    round(service.init_seconds * 1000)
+                    if service.init_seconds is not None
+                    else None
+                ),
+            }
+            for name, service in self.services.items()
+        }
+
+
+services = ServiceContainer()
@@ -0,0 +1,75 @@
+from typing import Any
+
+from pydantic.v1 import BaseModel, Field
+
+from langchain.schema import BaseMessage, AIMessage, HumanMessage
+
+
+class Turn(BaseModel):
+    "Represents a question and its answer in a conversation."
+    index: int = Field(..., description="The position of the turn in the conversation")
+    request_uuid: str | None = Field(
+        None,
+        description="The UUID of the request that asked the question",
+    )
+    prompt: str = Field(..., description="The question")
+    response: str | None = Field(None, description="The answer")
+    sent_at: int | None = Field(
+        None,
+        description="The timestamp of the question",
+    )
+    response_received_at: int | None = Field(
+        None,
+        description="The timestamp of the answer",
+    )
+
+    def to_messages(self) -> list[BaseMessage]:
+        """
+        Returns the turn as the messages a follow-up question is asked with.
+        """
+        return [
+            HumanMessage(
+                content=self.prompt,
+                additional_kwargs={
+                    "ts": self.sent_at,
+                },
+            ),
+            AIMessage(
+                content=self.response or "",
+                additional_kwargs={
+                    "ts": self.response_received_at,
+                    "ask_astro_request_uuid": self.request_uuid,
+                },
+            ),
+        ]
+
+    def to_firestore(self) -> dict[str, Any]:
+        return self.dict()
+
+    @classmethod
+    def from_dict(cls, dict: dict[str, Any]) -> "Turn":
+        return cls(**dict)
+
+    @classmethod
+    def from_messages(cls, messages: list[BaseMessage]) -> list["Turn"]:
+        """
+        Returns the turns of a conversation that was stored inline, as alternating
+        human and AI messages.
+        """
+        turns = []
+        for message in messages:
+            if message.type == "human":
+                turns.append(
+                    cls(
+                        index=len(turns),
+                        prompt=message.content,
+                        sent_at=message.additional_kwargs.get("ts"),
+                    )
+                )
+            elif turns and turns[-1].response is None:
+                turns[-1].response = message.content
+                turns[-1].response_received_at = message.additional_kwargs.get("ts")
+                turns[-1].request_uuid = message.additional_kwargs.get(
+                    "ask_astro_request_uuid"
+                )
+        return turns
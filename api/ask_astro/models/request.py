@@ -1,3 +1,4 @@
+from dataclasses import dataclass, field
 from datetime import datetime
 
 from uuid import UUID
@@ -8,21 +9,179 @@ from pydantic.v1 import BaseModel, Field
 from langchain.schema import BaseMessage, AIMessage, HumanMessage
 
 
-class Source(BaseModel):
+def message_to_firestore(message: BaseMessage) -> dict[str, Any]:
+    "Returns the message as a dict for Firestore, like `message.dict()` does."
+    return {
+        "content": message.content,
+        "additional_kwargs": message.additional_kwargs,
+        "example": getattr(message, "example", False),
+        "type": message.type,
+    }
+
+
+def messages_to_firestore(messages: list[BaseMessage]) -> list[dict[str, Any]]:
+    "Returns the messages as dicts for Firestore."
+    return [message_to_firestore(message) for message in messages]
+
+
+def messages_from_firestore(messages: list[dict[str, Any]]) -> list[BaseMessage]:
+    return [
+        (HumanMessage if msg.get("type") == "human" else AIMessage)(
+            content=msg["content"],
+            additional_kwargs=msg.get("additional_kwargs", {}),
+        )
+        for msg in messages
+    ]
+
+
+@dataclass(slots=True)
+class Source:
+    "Represents a source for a request."
+    name: str
+    snippet: str
+
+    def to_firestore(self) -> dict[str, Any]:
+        return {"name": self.name, "snippet": self.snippet}
+
+
+@dataclass(slots=True)
+class AskAstroRequest:
+    """
+    Represents a request to ask-astro. It's encoded to and decoded from
+    Firestore dicts directly, without validation, since it's encoded on every
+    save. `AskAstroRequestSchema` describes it in the OpenAPI spec.
+    """
+
+    uuid: UUID
+    prompt: str
+    status: str
+    messages: list[BaseMessage] = field(default_factory=list)
+    sources: list[Source] = field(default_factory=list)
+    response: str | None = None
+    langchain_run_id: UUID | None = None
+    score: int | None = None
+    response_received_at: int | None = None
+    sent_at: int = field(default_factory=lambda: int(datetime.now().timestamp()))
+    is_processed: bool = False
+    is_example: bool = False
+    route: str | None = None
+    conversation_id: str | None = None
+    turn_index: int | None = None
+
+    # the document as it was last saved to Firestore, if it was
+    _persisted: dict[str, Any] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # the messages, and their encoding, as of the last time they were encoded.
+    # Messages are replaced rather than edited, so they're only encoded again
+    # when they're replaced.
+    _encoded_messages: tuple[list[BaseMessage], list[dict[str, Any]]] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def messages_to_firestore(self) -> list[dict[str, Any]]:
+        encoded = self._encoded_messages
+        if encoded is None or encoded[0] is not self.messages:
+            encoded = self._encoded_messages = (
+                self.messages,
+                messages_to_firestore(self.messages),
+            )
+        return encoded[1]
+
+    def to_firestore(self) -> dict[str, Any]:
+        """
+        Returns the Request as a dict for Firestore.
+        """
+        return {
+            "uuid": str(self.uuid),
+            "prompt": self.prompt,
+            # the history of a conversation is stored once, in its turns
+            "messages": [] if self.conversation_id else self.messages_to_firestore(),
+            "sources": [source.to_firestore() for source in self.sources],
+            "response": self.response,
+            "status": self.status,
+            "langchain_run_id": str(self.langchain_run_id),
+            "score": self.score,
+            "sent_at": self.sent_at,
+            "response_received_at": self.response_received_at,
+            "is_processed": self.is_processed,
+            "is_example": self.is_example,
+            "route": self.route,
+            "conversation_id": self.conversation_id,
+            "turn_index": self.turn_index,
+        }
+
+    def is_persisted(self) -> bool:
+        return self._persisted is not None
+
+    def mark_persisted(self, persisted: dict[str, Any] | None = None):
+        """
+        Records that the request was saved to Firestore, as `persisted` or as it
+        currently is.
+        """
+        self._persisted = persisted if persisted is not None else self.to_firestore()
+
+    def changed_fields(self) -> dict[str, Any]:
+        """
+        Returns the Firestore fields that changed since the request was last saved,
+        or all of them if it never was.
+        """
+        fields = self.to_firestore()
+        if self._persisted is None:
+            return fields
+        return {
+            key: value
+            for key, value in fields.items()
+            if key not in self._persisted or self._persisted[key] != value
+        }
+
+    @classmethod
+    def from_dict(cls, dict: dict[str, Any]) -> "AskAstroRequest":
+        """
+        Returns the Request from a dict.
+        """
+        return cls(
+            uuid=UUID(dict["uuid"]),
+            prompt=dict["prompt"],
+            messages=messages_from_firestore(dict["messages"]),
+            sources=[
+                Source(name=source["name"], snippet=source["snippet"])
+                for source in dict["sources"]
+            ],
+            response=dict["response"],
+            status=dict["status"],
+            # unanswered requests are stored with a "None" run id
+            langchain_run_id=(
+                UUID(dict["langchain_run_id"])
+                if dict.get("langchain_run_id") not in (None, "None")
+                else None
+            ),
+            score=dict["score"],
+            sent_at=dict["sent_at"],
+            response_received_at=dict.get("response_received_at"),
+            is_processed=dict.get("is_processed", False),
+            is_example=dict.get("is_example", False),
+            route=dict.get("route"),
+            conversation_id=dict.get("conversation_id"),
+            turn_index=dict.get("turn_index"),
+        )
+
+
+class SourceSchema(BaseModel):
     "Represents a source for a request."
     name: str = Field(..., description="The name of the source")
     snippet: str = Field(..., description="The snippet of the source")
 
 
-class AskAstroRequest(BaseModel):
-    "Represents a request to ask-astro."
+class AskAstroRequestSchema(BaseModel):
+    "Describes `AskAstroRequest` in the OpenAPI spec."
     uuid: UUID = Field(..., description="The UUID of the request")
     prompt: str = Field(..., description="The prompt for the request")
     messages: list[BaseMessage] = Field(
         default_factory=list,
         description="The messages in the request",
     )
-    sources: list[Source] = Field(
+    sources: list[SourceSchema] = Field(
         default_factory=list,
         description="The sources for the request",
     )
@@ -55,54 +214,16 @@ class AskAstroRequest(BaseModel):
         False,
         description="Whether the request is an example",
     )
+    route: str | None = Field(
+        None,
+        description="How the request was answered, e.g. the combine-docs model",
+    )
 
-    def to_firestore(self) -> dict[str, Any]:
-        """
-        Returns the Request as a dict for Firestore.
-        """
-        return {
-            "uuid": str(self.uuid),
-            "prompt": self.prompt,
-            "messages": [
-                {
-                    **message.dict(),
-                    "type": message.type,
-                }
-                for message in self.messages
-            ],
-            "sources": [source.dict() for source in self.sources],
-            "response": self.response,
-            "status": self.status,
-            "langchain_run_id": str(self.langchain_run_id),
-            "score": self.score,
-            "sent_at": self.sent_at,
-            "response_received_at": self.response_received_at,
-            "is_processed": self.is_processed,
-            "is_example": self.is_example,
-        }
-
-    @classmethod
-    def from_dict(cls, dict: dict[str, Any]) -> "AskAstroRequest":
-        """
-        Returns the Request from a dict.
-        """
-        return cls(
-            uuid=UUID(dict["uuid"]),
-            prompt=dict["prompt"],
-            messages=[
-                (HumanMessage if msg.get("type") == "human" else AIMessage)(
-                    content=msg["content"],
-                    additional_kwargs=msg.get("additional_kwargs", {}),
-                )
-                for msg in dict["messages"]
-            ],
-            sources=[Source(**source) for source in dict["sources"]],
-            response=dict["response"],
-            status=dict["status"],
-            langchain_run_id=UUID(dict["langchain_run_id"]),
-            score=dict["score"],
-            sent_at=dict["sent_at"],
-            response_received_at=dict.get("response_received_at"),
-            is_processed=dict.get("is_processed", False),
-            is_example=dict.get("is_example", False),
-        )
+    conversation_id: str | None = Field(
+        None,
+        description="The ID of the conversation the request follows up on",
+    )
+    turn_index: int | None = Field(
+        None,
+        description="The position of the request's turn in its conversation",
+    )
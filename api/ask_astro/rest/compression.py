@@ -0,0 +1,220 @@
+"""
+Compresses responses with gzip or brotli, as negotiated with Accept-Encoding.
+
+JSON and text responses above a size threshold are compressed by a response
+middleware. Server-sent events are compressed as they're sent, and flushed after
+every event, so that clients still receive each event as soon as it's sent.
+"""
+import time
+import zlib
+
+from collections import OrderedDict
+from typing import Any
+
+from sanic import HTTPResponse, Request
+
+from ask_astro.config import CompressionConfig
+
+from logging import getLogger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def supported_encodings() -> list[str]:
+    "Returns the supported encodings, in order of preference."
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    "Returns the preferred encoding the client accepts, if any."
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        encoding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        accepted[encoding.strip()] = quality
+
+    candidates = [
+        encoding
+        for encoding in supported_encodings()
+        if accepted.get(encoding, accepted.get("*", 0)) > 0
+    ]
+    return max(
+        candidates,
+        key=lambda encoding: accepted.get(encoding, accepted.get("*", 0)),
+        default=None,
+    )
+
+
+def choose_encoding(request: Request, size: int) -> str | None:
+    "Returns the encoding that a body of `size` bytes is sent with, if any."
+    if size < CompressionConfig.min_size:
+        return None
+    return negotiate(request.headers.get("accept-encoding", ""))
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    "Each representation of a body has its own strong ETag."
+    return f'{etag[:-1]}-{encoding}"'
+
+
+class Encoder:
+    "Compresses a body in one or more chunks."
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(
+                quality=CompressionConfig.brotli_quality
+            )
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self.compressor = zlib.compressobj(
+                CompressionConfig.gzip_level, zlib.DEFLATED, 31
+            )
+
+    def compress(self, data: bytes) -> bytes:
+        "Compresses a chunk, and flushes it so that it can be decoded right away."
+        if self.encoding == "br":
+            return self.compressor.process(data) + self.compressor.flush()
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+class CompressionStats:
+    def __init__(self):
+        self.responses = 0
+        self.cached = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def record(self, start: float, bytes_in: int, bytes_out: int):
+        self.seconds += time.perf_counter() - start
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "responses": self.responses,
+            "cached": self.cached,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else 0,
+            "cpu_ms": round(self.seconds * 1000, 1),
+        }
+
+
+compression_stats = CompressionStats()
+
+# (ETag, encoding) -> compressed body, so that cached responses are only
+# compressed once
+compressed_bodies: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+
+
+def compress_body(body: bytes, encoding: str, etag: str | None) -> bytes:
+    key = (etag, encoding)
+    if etag is not None and key in compressed_bodies:
+        compression_stats.cached += 1
+        compressed_bodies.move_to_end(key)
+        return compressed_bodies[key]
+
+    start = time.perf_counter()
+    encoder = Encoder(encoding)
+    compressed = encoder.compress(body) + encoder.finish()
+    compression_stats.record(start, len(body), len(compressed))
+
+    if etag is not None:
+        compressed_bodies[key] = compressed
+        while len(compressed_bodies) > CompressionConfig.cache_size:
+            compressed_bodies.popitem(last=False)
+    return compressed
+
+
+def is_compressible(response: HTTPResponse) -> bool:
+    content_type = response.content_type or ""
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(
+        "text/event-stream"
+    )
+
+
+async def compress_response(request: Request, response: HTTPResponse):
+    "Response middleware that compresses the bodies of large enough responses."
+    if (
+        not CompressionConfig.enabled
+        # streamed responses have no body yet, they compress what they send
+        or response.body is None
+        or not is_compressible(response)
+        or "content-encoding" in response.headers
+    ):
+        return
+
+    response.headers["Vary"] = "Accept-Encoding"
+    encoding = choose_encoding(request, len(response.body))
+    if encoding is None:
+        return
+
+    etag = response.headers.get("etag")
+    response.body = compress_body(response.body, encoding, etag)
+    response.headers["Content-Encoding"] = encoding
+    response.headers.pop("content-length", None)
+    if etag is not None:
+        response.headers["ETag"] = encoded_etag(etag, encoding)
+    compression_stats.responses += 1
+
+
+class CompressedStream:
+    "Sends the chunks of a streamed response compressed, if the client accepts it."
+
+    def __init__(self, response: Any, encoder: Encoder | None):
+        self.response = response
+        self.encoder = encoder
+
+    async def send(self, data: str | bytes):
+        if isinstance(data, str):
+            data = data.encode()
+        if self.encoder is None:
+            await self.response.send(data)
+            return
+
+        start = time.perf_counter()
+        compressed = self.encoder.compress(data)
+        compression_stats.record(start, len(data), len(compressed))
+        await self.response.send(compressed)
+
+    async def eof(self):
+        if self.encoder is not None:
+            await self.response.send(self.encoder.finish())
+        await self.response.eof()
+
+
+async def respond_stream(
+    request: Request, *, content_type: str, headers: dict[str, str]
+) -> CompressedStream:
+    "Starts a streamed response, compressed if the client accepts it."
+    encoding = None
+    if CompressionConfig.enabled and CompressionConfig.streams_enabled:
+        encoding = negotiate(request.headers.get("accept-encoding", ""))
+
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        compression_stats.responses += 1
+
+    response = await request.respond(content_type=content_type, headers=headers)
+    return CompressedStream(response, Encoder(encoding) if encoding else None)
@@ -3,8 +3,11 @@
 from sanic import Sanic
 
 from ask_astro.rest.controllers.list_recent_requests import on_list_recent_requests
+from ask_astro.rest.controllers.metrics import on_get_metrics
 from ask_astro.rest.controllers.get_request import on_get_request
 from ask_astro.rest.controllers.post_request import on_post_request
+from ask_astro.rest.controllers.ready import on_get_ready
+from ask_astro.rest.controllers.stream_request import on_stream_request
 from ask_astro.rest.controllers.submit_feedback import on_submit_feedback
 
 from logging import getLogger
@@ -33,6 +36,14 @@ def register_routes(api: Sanic):
     )
     logger.info("Registered GET /requests/<request_id> controller")
 
+    api.add_route(
+        on_stream_request,
+        "/requests/<request_id:uuid>/stream",
+        methods=["GET"],
+        name="stream_request",
+    )
+    logger.info("Registered GET /requests/<request_id>/stream controller")
+
     api.add_route(
         on_post_request,
         "/requests",
@@ -48,3 +59,19 @@ def register_routes(api: Sanic):
         name="submit_feedback",
     )
     logger.info("Registered POST /requests/<request_id>/feedback controller")
+
+    api.add_route(
+        on_get_metrics,
+        "/metrics",
+        methods=["GET"],
+        name="get_metrics",
+    )
+    logger.info("Registered GET /metrics controller")
+
+    api.add_route(
+        on_get_ready,
+        "/ready",
+        methods=["GET"],
+        name="get_ready",
+    )
+    logger.info("Registered GET /ready controller")
@@ -2,33 +2,100 @@
 Handles GET requests to the /ask/{question_id} endpoint.
 """
 
+from contextlib import nullcontext
 from uuid import UUID
-from sanic import json, Request
+from sanic import json, HTTPResponse, Request
 from sanic_ext import openapi
 
-from ask_astro.config import FirestoreCollections
+from ask_astro.config import FirestoreCollections, LongPollConfig
 from ask_astro.clients.firestore import firestore_client
-from ask_astro.models.request import AskAstroRequest
+from ask_astro.models.request import AskAstroRequestSchema, messages_to_firestore
+from ask_astro.rest import etags, params
+from ask_astro.services.request_cache import CachedRequest, make_etag, request_cache
+from ask_astro.services.requests import conversation_messages
+from ask_astro.services.watchers import FINAL_STATUSES, request_watcher
 
 from logging import getLogger
 
 logger = getLogger(__name__)
 
 
-@openapi.definition(response=AskAstroRequest.schema_json())
-async def on_get_request(_: Request, request_id: UUID):
+def respond(request: Request, cached: CachedRequest) -> HTTPResponse:
+    response = etags.respond(request, cached)
+    if response.status == 304:
+        request_cache.not_modified += 1
+    return response
+
+
+@openapi.definition(response=AskAstroRequestSchema.schema_json())
+@openapi.parameter(
+    "wait",
+    float,
+    "query",
+    description="How many seconds to wait for the request's status to change",
+)
+@openapi.parameter(
+    "fields",
+    str,
+    "query",
+    description="The comma-separated fields to return, instead of the whole request",
+)
+async def on_get_request(request: Request, request_id: UUID):
     """
-    Handles GET requests to the /requests/{request_id} endpoint.
+    Handles GET requests to the /requests/{request_id} endpoint. With `?wait=`,
+    a request that isn't answered yet is returned once its status changes, or
+    as it is when the wait is over.
     """
     logger.info("Received GET request for request %s", request_id)
-    request = await (
-        firestore_client.collection(FirestoreCollections.requests)
-        .document(str(request_id))
-        .get()
-    )
-    logger.info("Request %s exists: %s", request_id, request.exists)
+    try:
+        wait = min(float(request.args.get("wait", 0)), LongPollConfig.max_wait_seconds)
+    except ValueError:
+        return json({"error": "wait must be a number of seconds"}, status=400)
+    try:
+        fields = params.parse_fields(request)
+    except ValueError as exc:
+        return json({"error": str(exc)}, status=400)
+
+    # answered requests are served without reading them again
+    cached = request_cache.get(str(request_id)) if fields is None else None
+    if cached is not None:
+        return respond(request, cached)
+
+    read_fields = None
+    if fields is not None:
+        # the status is needed to wait for changes, the conversation to rebuild
+        # the messages
+        read_fields = sorted({*fields, "status", "conversation_id", "turn_index"})
+
+    # subscribe before reading the request, so that no change is missed in between
+    watch = request_watcher.subscribe(str(request_id)) if wait > 0 else nullcontext()
+    async with watch as subscription:
+        doc = await (
+            (await firestore_client.aget())
+            .collection(FirestoreCollections.requests)
+            .document(str(request_id))
+            .get(field_paths=read_fields)
+        )
+        logger.info("Request %s exists: %s", request_id, doc.exists)
+
+        if not doc.exists:
+            return json({"error": "Question not found"}, status=404)
+
+        data = doc.to_dict()
+        if wait > 0 and data["status"] not in FINAL_STATUSES:
+            data = await subscription.wait_for_change(data["status"], wait) or data
 
-    if not request.exists:
-        return json({"error": "Question not found"}, status=404)
+    if (
+        (fields is None or "messages" in fields)
+        and data.get("conversation_id")
+        and not data.get("messages")
+    ):
+        # follow-ups only reference the turns of their conversation
+        data["messages"] = messages_to_firestore(
+            await conversation_messages(data["conversation_id"], data["turn_index"])
+        )
 
-    return json(request.to_dict(), status=200)
+    body = json(params.project(data, fields)).body
+    if fields is None and data["status"] in FINAL_STATUSES:
+        return respond(request, request_cache.store(str(request_id), body))
+    return respond(request, CachedRequest(body=body, etag=make_etag(body)))
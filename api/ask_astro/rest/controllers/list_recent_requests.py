@@ -7,45 +7,82 @@ from sanic_ext import openapi
 
 from pydantic.v1 import BaseModel, Field
 
-from ask_astro.config import FirestoreCollections
-from ask_astro.clients.firestore import firestore_client
-from ask_astro.models.request import AskAstroRequest
+from ask_astro.config import ExampleFeedConfig
+from ask_astro.rest import etags, params
+from ask_astro.services.example_feed import (
+    SUMMARY_FIELDS,
+    example_feed,
+    make_cursor,
+    summarize,
+)
+from ask_astro.services.request_cache import CachedRequest, make_etag
+
+
+class RequestSummary(BaseModel):
+    uuid: str = Field(..., description="The UUID of the request")
+    prompt: str = Field(..., description="The prompt of the request")
+    sent_at: int | None = Field(None, description="The timestamp of the request")
+    source_count: int = Field(..., description="How many sources the answer cites")
+    message_count: int = Field(
+        ..., description="How many messages came before the request"
+    )
 
 
 class RecentRequestsResponse(BaseModel):
-    requests: list[AskAstroRequest] = Field(
+    requests: list[RequestSummary] = Field(
         default_factory=list,
-        description="The requests",
+        description="The most recent example requests, or the fields asked for",
+    )
+    next: str | None = Field(
+        None,
+        description="The cursor to pass as `after` for the next page, if any",
     )
-
-    def to_dict(self):
-        return {
-            "requests": [request.to_firestore() for request in self.requests],
-        }
 
 
 @openapi.definition(
     response=RecentRequestsResponse.schema_json(),
 )
-async def on_list_recent_requests(_: Request):
+@openapi.parameter(
+    "after", str, "query", description="The cursor returned with the previous page"
+)
+@openapi.parameter("limit", int, "query", description="How many requests to return")
+@openapi.parameter(
+    "fields",
+    str,
+    "query",
+    description="The comma-separated fields to return, instead of the summaries",
+)
+async def on_list_recent_requests(request: Request):
     """
     Handles GET requests to the /requests endpoint.
     """
-    # list the most recent 5 requests
-    requests = await (
-        firestore_client.collection(FirestoreCollections.requests)
-        .order_by("sent_at", direction="DESCENDING")
-        .where("status", "==", "complete")
-        .where("is_example", "==", True)
-        .limit(12)
-        .get()
-    )
+    try:
+        after = params.parse_cursor(request)
+        limit = params.parse_limit(
+            request, ExampleFeedConfig.size, ExampleFeedConfig.max_page_size
+        )
+        fields = params.parse_fields(request)
+    except ValueError as exc:
+        return json({"error": str(exc)}, status=400)
+
+    # the first page of summaries is what every page load asks for
+    if after is None and fields is None and limit == ExampleFeedConfig.size:
+        return etags.respond(request, await example_feed.get())
 
-    return json(
-        RecentRequestsResponse(
-            requests=[
-                AskAstroRequest.from_dict(request.to_dict()) for request in requests
-            ]
-        ).to_dict(),
-        status=200,
+    examples = await example_feed.query(
+        after=after,
+        limit=limit,
+        fields=SUMMARY_FIELDS if fields is None else sorted({*fields, "sent_at"}),
     )
+    body = json(
+        {
+            "requests": [
+                summarize(example)
+                if fields is None
+                else params.project(example, fields)
+                for example in examples
+            ],
+            "next": make_cursor(examples[-1]) if len(examples) == limit else None,
+        }
+    ).body
+    return etags.respond(request, CachedRequest(body=body, etag=make_etag(body)))
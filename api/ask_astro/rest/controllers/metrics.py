@@ -0,0 +1,51 @@
+"""
+Handles GET requests to the /metrics endpoint.
+"""
+
+from sanic import json, Request
+from sanic_ext import openapi
+
+from ask_astro.clients.azure_openai import azure_openai_pool
+from ask_astro.clients.weaviate_ import embeddings
+from ask_astro.container import services
+from ask_astro.rest.compression import compression_stats
+from ask_astro.services.admission import admission_controller
+from ask_astro.services.answer_cache import answer_cache
+from ask_astro.services.example_feed import example_feed
+from ask_astro.services.request_cache import request_cache
+from ask_astro.services.requests import conversation_store, request_store
+from ask_astro.services.single_flight import single_flight
+from ask_astro.services.watchers import request_watcher
+
+
+@openapi.definition(summary="Reports internal metrics of this instance")
+async def on_get_metrics(_: Request):
+    """
+    Handles GET requests to the /metrics endpoint.
+    """
+    # clients that haven't been used yet aren't created just to report on them
+    return json(
+        {
+            "services": services.stats(),
+            "admission": admission_controller.stats(),
+            "answer_cache": answer_cache.stats(),
+            "single_flight": single_flight.stats(),
+            "embedding_cache": embeddings.stats() if embeddings.initialized else {},
+            "azure_openai": (
+                azure_openai_pool.stats() if azure_openai_pool.initialized else {}
+            ),
+            "request_cache": request_cache.stats(),
+            "compression": compression_stats.stats(),
+            "example_feed": example_feed.stats(),
+            "request_store": (
+                request_store.stats() if request_store.initialized else {}
+            ),
+            "conversation_store": (
+                conversation_store.stats() if conversation_store.initialized else {}
+            ),
+            "request_watcher": (
+                request_watcher.stats() if request_watcher.initialized else {}
+            ),
+        },
+        status=200,
+    )
@@ -9,12 +9,12 @@ from logging import getLogger
 from sanic import json, Request
 from sanic_ext import openapi
 
-from pydantic.v1 import BaseModel, Field
-from langchain.schema import AIMessage, HumanMessage
+from pydantic.v1 import BaseModel, Field, ValidationError
 
 from ask_astro.config import FirestoreCollections
 from ask_astro.models.request import AskAstroRequest
-from ask_astro.services.questions import answer_question
+from ask_astro.services.admission import admission_controller
+from ask_astro.services.requests import conversation_store
 from ask_astro.clients.firestore import firestore_client
 
 logger = getLogger(__name__)
@@ -22,6 +22,11 @@ logger = getLogger(__name__)
 
 class PostRequestResponse(BaseModel):
     request_uuid: str = Field(..., description="The UUID of the request")
+    stream: bool = Field(
+        ...,
+        description="Whether the answer can be read from /requests/{uuid}/stream. "
+        "If not, poll /requests/{uuid}?wait= instead",
+    )
 
 
 class PostRequestBody(BaseModel):
@@ -30,6 +35,10 @@ class PostRequestBody(BaseModel):
         None,
         description="The UUID of the request to continue",
     )
+    stream: bool = Field(
+        False,
+        description="Whether the answer will be read from /requests/{uuid}/stream",
+    )
 
 
 @openapi.definition(
@@ -40,16 +49,23 @@ async def on_post_request(request: Request):
     """
     Handles POST requests to the /requests endpoint.
     """
-    if "prompt" not in request.json:
-        return json({"error": "prompt is required"}, status=400)
+    try:
+        body = PostRequestBody.parse_obj(request.json)
+    except ValidationError as exc:
+        errors = "; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+            for error in exc.errors()
+        )
+        return json({"error": errors}, status=400)
 
-    messages = []
-    if "from_request_uuid" in request.json:
-        from_request_uuid = request.json["from_request_uuid"]
+    conversation_id, turn_index = None, None
+    if body.from_request_uuid:
+        from_request_uuid = body.from_request_uuid
         logger.info("Received request to continue %s", from_request_uuid)
 
         from_request = await (
-            firestore_client.collection(FirestoreCollections.requests)
+            (await firestore_client.aget())
+            .collection(FirestoreCollections.requests)
             .document(from_request_uuid)
             .get()
         )
@@ -62,39 +78,37 @@ async def on_post_request(request: Request):
                 status=404,
             )
 
-        from_request = AskAstroRequest.from_dict(from_request.to_dict())
-
-        messages = from_request.messages if from_request else []
-        messages.append(
-            HumanMessage(
-                content=from_request.prompt,
-                additional_kwargs={
-                    "ts": from_request.sent_at,
-                },
-            )
-        )
-        messages.append(
-            AIMessage(
-                content=from_request.response,
-                additional_kwargs={
-                    "ts": from_request.response_received_at,
-                    "ask_astro_request_uuid": from_request_uuid,
-                },
-            )
+        # the follow-up references the conversation, instead of copying it
+        store = await conversation_store.aget()
+        conversation_id, turn_index = await store.continue_from(
+            AskAstroRequest.from_dict(from_request.to_dict())
         )
 
     req = AskAstroRequest(
         uuid=uuid.uuid1(),
-        prompt=request.json["prompt"],
+        prompt=body.prompt,
         status="in_progress",
-        messages=messages,
+        conversation_id=conversation_id,
+        turn_index=turn_index,
     )
 
-    request.app.add_task(lambda: answer_question(req))
+    # only requests answered by this instance can be streamed
+    stream = body.stream and admission_controller.streamable
+    if not await admission_controller.submit(req, stream=stream):
+        retry_after = admission_controller.retry_after()
+        return json(
+            {
+                "error": "Too many questions are being answered, try again later",
+                "retry_after": retry_after,
+            },
+            status=503,
+            headers={"Retry-After": str(retry_after)},
+        )
 
     return json(
         PostRequestResponse(
             request_uuid=str(req.uuid),
+            stream=stream,
         ).dict(),
         status=200,
     )
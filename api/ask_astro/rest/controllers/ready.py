@@ -0,0 +1,18 @@
+"""
+Handles GET requests to the /ready endpoint.
+"""
+
+from sanic import json, Request
+from sanic_ext import openapi
+
+from ask_astro.services.readiness import readiness
+
+
+@openapi.definition(summary="Reports whether this instance is warmed up")
+async def on_get_ready(_: Request):
+    """
+    Handles GET requests to the /ready endpoint. Responds with a 503 until the
+    connections to every dependency are warmed up, along with the latency of
+    each warm-up probe.
+    """
+    return json(readiness.report(), status=200 if readiness.ready else 503)
@@ -0,0 +1,70 @@
+"""
+Handles GET requests to the /requests/{question_id}/stream endpoint.
+"""
+
+from typing import Any
+from uuid import UUID
+
+from sanic import json, Request
+from sanic_ext import openapi
+
+from ask_astro.config import FirestoreCollections
+from ask_astro.clients.firestore import firestore_client
+from ask_astro.encoding import dumps
+from ask_astro.rest.compression import respond_stream
+from ask_astro.services.streams import FINAL_EVENTS, answer_streams
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+def format_event(event: str, data: dict[str, Any]) -> str:
+    "Formats an event for the text/event-stream protocol."
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+@openapi.definition(
+    summary="Streams the answer to a request as server-sent events",
+)
+async def on_stream_request(request: Request, request_id: UUID):
+    """
+    Handles GET requests to the /requests/{request_id}/stream endpoint. Sends a
+    `queued` event, `token` events as the answer is generated, and a single
+    `complete` or `error` event with the final state of the request.
+
+    Requests that aren't streamed by this instance get a single event with their
+    stored state: `complete` or `error` if they're answered, or `pending` if not,
+    in which case the client should long-poll /requests/{request_id}?wait=.
+    """
+    logger.info("Received stream request for request %s", request_id)
+    stream = answer_streams.get(request_id)
+
+    if stream is None:
+        # the request is not being answered by this instance, so send the
+        # state stored in the database
+        doc = await (
+            (await firestore_client.aget())
+            .collection(FirestoreCollections.requests)
+            .document(str(request_id))
+            .get()
+        )
+        if not doc.exists:
+            return json({"error": "Question not found"}, status=404)
+
+        data = doc.to_dict()
+
+    response = await respond_stream(
+        request,
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+    if stream is None:
+        event = data["status"] if data["status"] in FINAL_EVENTS else "pending"
+        await response.send(format_event(event, data))
+    else:
+        async for event, event_data in stream.subscribe():
+            await response.send(format_event(event, event_data))
+
+    await response.eof()
@@ -0,0 +1,46 @@
+"Conditional responses, for clients that revalidate what they have with ETags"
+
+from sanic import HTTPResponse, Request
+
+from ask_astro.config import CompressionConfig
+from ask_astro.rest.compression import choose_encoding, encoded_etag
+from ask_astro.services.request_cache import CachedRequest
+
+
+# compressed responses have the ETag of their body, suffixed with the encoding
+ENCODING_SUFFIXES = ('-br"', '-gzip"')
+
+
+def strip_encoding(etag: str) -> str:
+    for suffix in ENCODING_SUFFIXES:
+        if etag.endswith(suffix):
+            return etag.removesuffix(suffix) + '"'
+    return etag
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    "Whether the request's If-None-Match header matches the ETag."
+    if_none_match = request.headers.get("If-None-Match", "")
+    etags = [
+        strip_encoding(tag.strip().removeprefix("W/"))
+        for tag in if_none_match.split(",")
+    ]
+    return etag in etags or "*" in etags
+
+
+def respond(request: Request, cached: CachedRequest) -> HTTPResponse:
+    "Responds with the body, or 304 if the client already has this version."
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, cached.etag):
+        # 304s have no body for the compression middleware to encode, so they
+        # get the ETag of the representation the body would have been sent as
+        if CompressionConfig.enabled:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = choose_encoding(request, len(cached.body))
+            if encoding is not None:
+                headers["ETag"] = encoded_etag(cached.etag, encoding)
+        return HTTPResponse(status=304, headers=headers)
+
+    return HTTPResponse(
+        cached.body, status=200, headers=headers, content_type="application/json"
+    )
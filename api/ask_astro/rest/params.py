@@ -0,0 +1,51 @@
+"Parses the pagination and projection query parameters of the requests endpoints"
+
+from typing import Any
+
+from sanic import Request
+
+from ask_astro.models.request import AskAstroRequestSchema
+
+REQUEST_FIELDS = set(AskAstroRequestSchema.__fields__)
+
+
+def parse_fields(request: Request) -> list[str] | None:
+    """
+    Returns the fields the client asked for with `?fields=a,b`, or None for the
+    whole request. Raises ValueError for fields requests don't have.
+    """
+    value = request.args.get("fields")
+    if not value:
+        return None
+
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = set(fields) - REQUEST_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    # the uuid identifies the request, so it's always returned
+    return ["uuid"] + [field for field in fields if field != "uuid"]
+
+
+def project(data: dict[str, Any], fields: list[str] | None) -> dict[str, Any]:
+    if fields is None:
+        return data
+    return {field: data.get(field) for field in fields}
+
+
+def parse_limit(request: Request, default: int, maximum: int) -> int:
+    value = request.args.get("limit", str(default))
+    if not value.isdigit() or not 0 < int(value) <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return int(value)
+
+
+def parse_cursor(request: Request) -> tuple[int, str] | None:
+    "Returns the (sent_at, uuid) of the request that `?after=` starts after."
+    value = request.args.get("after")
+    if not value:
+        return None
+
+    sent_at, _, uuid = value.partition(",")
+    if not uuid or not sent_at.isdigit():
+        raise ValueError("after must be a cursor of the form <sent_at>,<uuid>")
+    return int(sent_at), uuid
@@ -0,0 +1,122 @@
+"Admission control for questions submitted through the REST API"
+import math
+
+from ask_astro.config import AdmissionConfig, AnswerConfig, JobQueueConfig
+from ask_astro.container import Lazy
+from ask_astro.models.request import AskAstroRequest
+from ask_astro.services.jobs import Worker, job_queue
+from ask_astro.services.requests import request_store
+from ask_astro.services.streams import expire_stream, open_stream
+from ask_astro.stores.job_queues import InMemoryJobQueue, JobQueue
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    Puts questions on the job queue, to be answered by a fixed number of workers.
+    When the queue is full, new questions are rejected instead of piling up.
+
+    With embedded workers, questions are answered in this process. Otherwise they
+    are left to `python -m ask_astro.worker`. Questions can only be streamed if
+    they're answered in this process, i.e. with embedded workers and an in-memory
+    queue that no other process claims jobs from.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        *,
+        max_queue_size: int,
+        workers: int,
+        embedded: bool,
+    ):
+        self.queue = queue
+        self.max_queue_size = max_queue_size
+        self.workers = workers
+        self.worker = Worker(queue, concurrency=workers) if embedded else None
+        self.streamable = embedded and isinstance(queue, InMemoryJobQueue)
+        self.queue_depth = 0
+        # slots taken by requests that are admitted but not enqueued yet
+        self.reserved = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def start(self):
+        "Starts the embedded workers. Must be called from within the running event loop."
+        if self.worker is not None:
+            self.worker.start()
+
+    async def stop(self):
+        if self.worker is not None:
+            await self.worker.stop()
+
+    def retry_after(self) -> int:
+        "Estimates how many seconds it will take for a queue slot to free up."
+        avg_service_seconds = (
+            self.worker.avg_service_seconds if self.worker is not None else 30.0
+        )
+        return max(1, math.ceil(self.queue_depth * avg_service_seconds / self.workers))
+
+    async def submit(self, request: AskAstroRequest, stream: bool = False) -> bool:
+        """
+        Queues the request to be answered. Returns False if the queue is full.
+        """
+        # the depth check and the reservation happen without an await in between,
+        # so concurrent submits can't all be admitted into the last free slot
+        self.queue_depth = await self.queue.depth()
+        if self.queue_depth + self.reserved >= self.max_queue_size:
+            self.rejected += 1
+            logger.warning("Rejected request %s, queue is full", request.uuid)
+            return False
+        self.reserved += 1
+
+        try:
+            # tokens can only be streamed from this process
+            stream = stream and self.streamable
+
+            # the queued status must be visible before a worker can overwrite it, so
+            # the job is only enqueued once the save succeeded. streamed requests are
+            # written too, so that they can be read while they're being answered.
+            request.status = "queued"
+            await (await request_store.aget()).save(request, immediate=True)
+            if stream:
+                await open_stream(request.uuid).publish("queued", {"status": "queued"})
+                expire_stream(request.uuid, AnswerConfig.stream_timeout_seconds)
+
+            await self.queue.enqueue(
+                str(request.uuid),
+                {
+                    "request": request.to_firestore(),
+                    "stream": stream,
+                    "persisted": request.is_persisted(),
+                },
+            )
+        finally:
+            self.reserved -= 1
+
+        self.admitted += 1
+        self.queue_depth += 1
+        return True
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "reserved": self.reserved,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            **(self.worker.stats() if self.worker is not None else {}),
+        }
+
+
+admission_controller: Lazy[AdmissionController] = Lazy(
+    "admission_controller",
+    lambda: AdmissionController(
+        job_queue.get(),
+        max_queue_size=AdmissionConfig.max_queue_size,
+        workers=AdmissionConfig.workers,
+        embedded=JobQueueConfig.embedded_workers,
+    ),
+)
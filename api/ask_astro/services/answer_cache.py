@@ -0,0 +1,128 @@
+"Semantic cache of answers to previously asked questions"
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from uuid import UUID
+
+import numpy as np
+
+from ask_astro.config import SemanticCacheConfig
+from ask_astro.clients.weaviate_ import embeddings
+from ask_astro.models.request import AskAstroRequest, Source
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    "An answer to a completed request, along with its prompt embedding."
+    request_uuid: UUID
+    vector: np.ndarray
+    response: str
+    sources: list[Source]
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticAnswerCache:
+    """
+    Caches answers to completed requests, keyed by the embedding of their prompt.
+    A new prompt is served from the cache if it is similar enough to a cached one.
+    """
+
+    def __init__(
+        self,
+        *,
+        similarity_threshold: float,
+        ttl_seconds: int,
+        max_entries: int,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: OrderedDict[UUID, CachedAnswer] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_cacheable(request: AskAstroRequest) -> bool:
+        "Follow-up questions depend on the conversation, so they are never cached."
+        return not request.messages and request.conversation_id is None
+
+    async def embed(self, prompt: str) -> np.ndarray:
+        model = await embeddings.aget()
+        vector = np.asarray(await model.aembed_query(prompt), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def evict_expired(self):
+        now = time.monotonic()
+        for key in [
+            key
+            for key, entry in self.entries.items()
+            if now - entry.created_at > self.ttl_seconds
+        ]:
+            del self.entries[key]
+
+    async def lookup(
+        self, request: AskAstroRequest
+    ) -> tuple[CachedAnswer | None, np.ndarray | None]:
+        """
+        Returns the cached answer whose prompt is most similar to the request's
+        prompt, if it is above the similarity threshold, along with the prompt's
+        embedding so that `store` doesn't compute it again. The embedding is None
+        if the cache is empty.
+        """
+        self.evict_expired()
+        if not self.entries:
+            self.misses += 1
+            return None, None
+
+        vector = await self.embed(request.prompt)
+        keys = list(self.entries.keys())
+        similarities = np.stack([self.entries[key].vector for key in keys]) @ vector
+        best = int(np.argmax(similarities))
+
+        if similarities[best] < self.similarity_threshold:
+            self.misses += 1
+            return None, vector
+
+        self.hits += 1
+        self.entries.move_to_end(keys[best])
+        logger.info(
+            "Semantic cache hit for request %s (similarity %.3f to request %s)",
+            request.uuid,
+            similarities[best],
+            keys[best],
+        )
+        return self.entries[keys[best]], vector
+
+    async def store(self, request: AskAstroRequest, vector: np.ndarray | None = None):
+        "Adds a completed request to the cache, with the embedding of its prompt."
+        if vector is None:
+            vector = await self.embed(request.prompt)
+        self.entries[request.uuid] = CachedAnswer(
+            request_uuid=request.uuid,
+            vector=vector,
+            response=request.response,
+            sources=request.sources,
+        )
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int | float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+        }
+
+
+answer_cache = SemanticAnswerCache(
+    similarity_threshold=SemanticCacheConfig.similarity_threshold,
+    ttl_seconds=SemanticCacheConfig.ttl_seconds,
+    max_entries=SemanticCacheConfig.max_entries,
+)
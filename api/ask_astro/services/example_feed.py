@@ -0,0 +1,154 @@
+"""
+Serves the feed of example requests shown on the home page from memory.
+
+The find_example_runs DAG materializes the feed into a single document whenever
+it marks new examples, with only the fields the UI renders. Until it has, the
+feed is built from a query of the most recent examples. The DAG stores the
+source and message counts on each example, so that the query doesn't read the
+sources and messages themselves.
+"""
+import asyncio
+import time
+
+from typing import Any
+
+from google.cloud import firestore
+
+from ask_astro.config import ExampleFeedConfig, FirestoreCollections
+from ask_astro.clients.firestore import firestore_client
+from ask_astro.encoding import dumps
+from ask_astro.services.request_cache import CachedRequest, make_etag
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# the fields of a request that its summary is made from
+SUMMARY_FIELDS = ["uuid", "prompt", "sent_at", "source_count", "message_count"]
+
+
+def make_cursor(request: dict[str, Any]) -> str:
+    "Returns the cursor to the page of examples after the given request."
+    return f"{request['sent_at']},{request['uuid']}"
+
+
+def summarize(request: dict[str, Any]) -> dict[str, Any]:
+    "Returns the fields of an example that the feed shows."
+    return {
+        "uuid": request["uuid"],
+        "prompt": request["prompt"],
+        "sent_at": request.get("sent_at"),
+        # the DAG backfills the counts of examples marked before it stored them
+        "source_count": request.get("source_count", 0),
+        "message_count": request.get("message_count", 0),
+    }
+
+
+class ExampleFeed:
+    """
+    Keeps the serialized feed in memory for `ttl_seconds`. Only one refresh runs
+    at a time, and a stale feed keeps being served for another `ttl_seconds` when
+    a refresh fails.
+    """
+
+    def __init__(self, *, document: str, size: int, ttl_seconds: int):
+        self.document = document
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self.cached: CachedRequest | None = None
+        self.lock = asyncio.Lock()
+        self.hits = 0
+        self.refreshes = 0
+        self.materialized = False
+
+    def is_fresh(self) -> bool:
+        return (
+            self.cached is not None
+            and time.monotonic() - self.cached.created_at < self.ttl_seconds
+        )
+
+    async def load(self) -> list[dict[str, Any]]:
+        doc = await (
+            (await firestore_client.aget())
+            .collection(FirestoreCollections.feeds)
+            .document(self.document)
+            .get()
+        )
+        self.materialized = doc.exists
+        if doc.exists:
+            return doc.to_dict()["requests"][: self.size]
+
+        logger.info("Example feed isn't materialized yet, querying examples")
+        examples = await self.query(after=None, limit=self.size, fields=SUMMARY_FIELDS)
+        return [summarize(example) for example in examples]
+
+    async def query(
+        self, *, after: tuple[int, str] | None, limit: int, fields: list[str]
+    ) -> list[dict[str, Any]]:
+        """
+        Returns the given fields of the examples, newest first, starting after the
+        (sent_at, uuid) cursor.
+        """
+        # requests are stored under their uuid, and ordering by the document id
+        # is served by the same index as ordering by sent_at alone
+        document_id = firestore.FieldPath.document_id()
+        collection = (await firestore_client.aget()).collection(
+            FirestoreCollections.requests
+        )
+        query = (
+            collection.where("status", "==", "complete")
+            .where("is_example", "==", True)
+            .order_by("sent_at", direction="DESCENDING")
+            .order_by(document_id, direction="DESCENDING")
+        )
+        if after is not None:
+            query = query.start_after(
+                {"sent_at": after[0], document_id: collection.document(after[1])}
+            )
+
+        snapshots = await query.select(fields).limit(limit).get()
+        return [snapshot.to_dict() for snapshot in snapshots]
+
+    async def get(self) -> CachedRequest:
+        if self.is_fresh():
+            self.hits += 1
+            return self.cached
+
+        async with self.lock:
+            # another request may have refreshed it while this one waited
+            if self.is_fresh():
+                self.hits += 1
+                return self.cached
+
+            try:
+                requests = await self.load()
+            except Exception as exc:
+                if self.cached is None:
+                    raise
+                logger.warning("Serving a stale example feed", exc_info=exc)
+                # back off, rather than retrying on every request while it's down
+                self.cached.created_at = time.monotonic()
+                return self.cached
+
+            self.refreshes += 1
+            cursor = make_cursor(requests[-1]) if len(requests) == self.size else None
+            body = dumps({"requests": requests, "next": cursor})
+            self.cached = CachedRequest(body=body, etag=make_etag(body))
+            return self.cached
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "materialized": self.materialized,
+            "age_seconds": round(time.monotonic() - self.cached.created_at)
+            if self.cached is not None
+            else None,
+        }
+
+
+example_feed = ExampleFeed(
+    document=ExampleFeedConfig.document,
+    size=ExampleFeedConfig.size,
+    ttl_seconds=ExampleFeedConfig.ttl_seconds,
+)
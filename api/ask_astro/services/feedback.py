@@ -6,6 +6,7 @@ from typing import Any
 from ask_astro.config import FirestoreCollections
 from ask_astro.clients.firestore import firestore_client
 from ask_astro.clients.langsmith_ import langsmith_client
+from ask_astro.services.request_cache import request_cache
 
 from logging import getLogger
 
@@ -20,35 +21,40 @@ async def submit_feedback(
     """
     logger.info("Submitting feedback for request %s: %s", request_id, correct)
     # first, get the request from the database
+    client = await firestore_client.aget()
     request = await (
-        firestore_client.collection(FirestoreCollections.requests)
-        .document(request_id)
-        .get()
+        client.collection(FirestoreCollections.requests).document(request_id).get()
     )
 
     if not request.exists:
         raise ValueError(f"Request {request_id} does not exist")
 
+    # answers served from the semantic cache don't have a run of their own, so
+    # their feedback is only recorded in the database
     langchain_run_id = request.to_dict().get("langchain_run_id")
-    if not langchain_run_id:
-        raise ValueError(f"Request {request_id} does not have a langchain run id")
+    if langchain_run_id in (None, "None"):
+        langchain_run_id = None
 
     # update the db and langsmith
     async with asyncio.TaskGroup() as tg:
         # update just the score field
         tg.create_task(
-            firestore_client.collection(FirestoreCollections.requests)
+            client.collection(FirestoreCollections.requests)
             .document(request_id)
             .update({"score": 1 if correct else 0})
         )
 
-        tg.create_task(
-            asyncio.to_thread(
-                lambda: langsmith_client.create_feedback(
-                    key="correctness",
-                    run_id=langchain_run_id,
-                    score=1 if correct else 0,
-                    source_info=source_info,
+        if langchain_run_id is not None:
+            tg.create_task(
+                asyncio.to_thread(
+                    lambda: langsmith_client.create_feedback(
+                        key="correctness",
+                        run_id=langchain_run_id,
+                        score=1 if correct else 0,
+                        source_info=source_info,
+                    )
                 )
             )
-        )
+
+    # the cached response has the previous score
+    request_cache.invalidate(request_id)
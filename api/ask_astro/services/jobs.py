@@ -0,0 +1,193 @@
+"Answers questions taken from the job queue"
+import asyncio
+import socket
+import time
+import uuid
+
+from ask_astro.config import FirestoreCollections, JobQueueConfig
+from ask_astro.clients.firestore import firestore_client
+from ask_astro.container import Lazy
+from ask_astro.models.request import AskAstroRequest
+from ask_astro.services.questions import answer_question
+from ask_astro.services.requests import request_store
+from ask_astro.stores.job_queues import (
+    FirestoreJobQueue,
+    InMemoryJobQueue,
+    Job,
+    JobQueue,
+    SQLiteJobQueue,
+)
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# weight of the newest observation in the rolling service and wait times
+EWMA_WEIGHT = 0.2
+
+
+def make_job_queue() -> JobQueue:
+    "Returns the job queue of the configured backend."
+    if JobQueueConfig.backend == "memory":
+        return InMemoryJobQueue(max_attempts=JobQueueConfig.max_attempts)
+    if JobQueueConfig.backend == "sqlite":
+        return SQLiteJobQueue(
+            path=JobQueueConfig.sqlite_path,
+            max_attempts=JobQueueConfig.max_attempts,
+        )
+    if JobQueueConfig.backend == "firestore":
+        return FirestoreJobQueue(
+            client=firestore_client.get(),
+            collection=FirestoreCollections.jobs,
+            max_attempts=JobQueueConfig.max_attempts,
+        )
+    raise ValueError(f"Unknown job queue backend: {JobQueueConfig.backend}")
+
+
+job_queue: Lazy[JobQueue] = Lazy("job_queue", make_job_queue)
+
+
+class Worker:
+    """
+    Claims jobs from the queue and answers them, `concurrency` at a time. The
+    lease of each job is extended while it's being answered, so that only jobs of
+    workers that died are picked up again.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        *,
+        concurrency: int,
+        lease_seconds: float | None = None,
+        poll_interval: float | None = None,
+    ):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds or JobQueueConfig.lease_seconds
+        self.poll_interval = poll_interval or JobQueueConfig.poll_interval
+        self.id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.tasks: list[asyncio.Task] = []
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.avg_wait_seconds = 0.0
+        # a conservative starting guess, until the first question is answered
+        self.avg_service_seconds = 30.0
+
+    def start(self):
+        "Starts the worker. Must be called from within the running event loop."
+        self.tasks = [
+            asyncio.create_task(self.work(), name=f"answer-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def run(self):
+        "Runs the worker until it's cancelled."
+        self.start()
+        try:
+            await asyncio.gather(*self.tasks)
+        finally:
+            await self.stop()
+
+    async def work(self):
+        while True:
+            try:
+                job = await self.queue.claim(self.id, self.lease_seconds)
+            except Exception as exc:
+                logger.error("Failed to claim a job", exc_info=exc)
+                job = None
+
+            if job is None:
+                await self.queue.wait(self.poll_interval)
+                continue
+
+            try:
+                await self.process(job)
+            except Exception as exc:
+                # e.g. a payload that can't be decoded, or the queue failing
+                # to complete the job. The worker must keep going either way.
+                self.failed += 1
+                logger.error("Failed to process job %s", job.id, exc_info=exc)
+                try:
+                    await self.queue.release(job)
+                except Exception as exc:
+                    logger.error("Failed to release job %s", job.id, exc_info=exc)
+
+    async def process(self, job: Job):
+        request = AskAstroRequest.from_dict(job.payload["request"])
+        # so that only the fields that change are written from here on
+        if job.payload.get("persisted"):
+            request.mark_persisted(job.payload["request"])
+
+        wait = time.time() - job.enqueued_at
+        self.avg_wait_seconds += EWMA_WEIGHT * (wait - self.avg_wait_seconds)
+        logger.info(
+            "Request %s waited %.1fs in queue, attempt %d",
+            request.uuid,
+            wait,
+            job.attempts,
+        )
+
+        # the lease of a previous attempt expired on every try, e.g. because the
+        # question keeps crashing the worker, so give up on it
+        if job.attempts > self.queue.max_attempts:
+            await self.give_up(job, request)
+            return
+
+        self.in_flight += 1
+        start = time.monotonic()
+        heartbeat = asyncio.create_task(self.heartbeat(job))
+        try:
+            await answer_question(request, stream=job.payload.get("stream", False))
+        except Exception as exc:
+            self.failed += 1
+            logger.error("Failed to answer request %s", request.uuid, exc_info=exc)
+            # answer_question already marked the request as errored, which stands
+            # if there are no attempts left
+            if await self.queue.release(job):
+                logger.info("Request %s will be retried", request.uuid)
+            return
+        finally:
+            heartbeat.cancel()
+            self.in_flight -= 1
+            self.avg_service_seconds += EWMA_WEIGHT * (
+                time.monotonic() - start - self.avg_service_seconds
+            )
+
+        self.completed += 1
+        await self.queue.complete(job)
+
+    async def heartbeat(self, job: Job):
+        "Extends the lease of the job until cancelled."
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.queue.extend(job, self.lease_seconds)
+            except Exception as exc:
+                logger.warning("Failed to extend lease of job %s", job.id, exc_info=exc)
+
+    async def give_up(self, job: Job, request: AskAstroRequest):
+        logger.error(
+            "Giving up on request %s after %d attempts", request.uuid, job.attempts - 1
+        )
+        self.failed += 1
+        request.status = "error"
+        request.response = "Sorry, something went wrong. Please try again later."
+        await (await request_store.aget()).save(request)
+        await self.queue.complete(job)
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_seconds": round(self.avg_wait_seconds, 3),
+            "avg_service_seconds": round(self.avg_service_seconds, 3),
+        }
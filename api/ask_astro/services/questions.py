@@ -2,42 +2,95 @@
 import asyncio
 import time
 
+from typing import Any
+from uuid import UUID
+
+import numpy as np
+import openai
 from langchain import callbacks
 
-from ask_astro.config import FirestoreCollections
-from ask_astro.clients.firestore import firestore_client
+from ask_astro.config import AnswerConfig, SemanticCacheConfig
+from ask_astro.clients.http import get_http_session
 from ask_astro.models.request import AskAstroRequest, Source
-from ask_astro.chains.answer_question import answer_question_chain
+from ask_astro.chains.answer_question import answer_question_chains, route_question
+from ask_astro.services.answer_cache import answer_cache
+from ask_astro.services.requests import load_history, request_store
+from ask_astro.services.single_flight import question_key, single_flight
+from ask_astro.services.streams import AnswerStreamHandler, close_stream, open_stream
 
 from logging import getLogger
 
 logger = getLogger(__name__)
 
+# bounds the number of chains running at once, now that they no longer hold a
+# thread. Slack mentions don't go through the admission queue, so the workers
+# alone don't bound them.
+answer_semaphore = asyncio.Semaphore(AnswerConfig.max_concurrency)
+
 
-async def answer_question(request: AskAstroRequest):
+async def answer_question(request: AskAstroRequest, stream: bool = False):
     """
     Performs the actual question answering logic. Writes to the request object.
+
+    If `stream` is set, the answer tokens are published to the request's answer
+    stream as they are generated, and the request is only written to the database
+    again once it is finished. Requests that join an identical question already being
+    answered only receive the final answer.
     """
+    # send all OpenAI calls made by this task over the shared connection pool
+    openai.aiosession.set(get_http_session())
+    store = await request_store.aget()
+
     try:
-        # first, mark the request as in_progress and add it to the database
+        # follow-ups only reference their conversation, so rebuild its history
+        await load_history(request)
+        use_cache = SemanticCacheConfig.enabled and answer_cache.is_cacheable(request)
+
+        # serve paraphrases of already answered questions from the semantic cache
+        prompt_vector = None
+        if use_cache:
+            answered, prompt_vector = await answer_from_cache(request)
+            if answered:
+                return
+
+        # first, mark the request as in_progress and add it to the database.
+        # streamed requests report their progress over the stream instead.
         request.status = "in_progress"
-        await firestore_client.collection(FirestoreCollections.requests).document(
-            str(request.uuid)
-        ).set(request.to_firestore())
-
-        # then, run the question answering chain
-        with callbacks.collect_runs() as cb:
-            result = await asyncio.to_thread(
-                lambda: answer_question_chain(
-                    {
-                        "question": request.prompt,
-                        "chat_history": [],
-                        "messages": request.messages,
-                    },
-                    metadata={"request_id": str(request.uuid)},
-                )
-            )
-            request.langchain_run_id = cb.traced_runs[0].id
+        chain_callbacks = []
+        if stream:
+            chain_callbacks.append(AnswerStreamHandler(open_stream(request.uuid)))
+        else:
+            await store.save(request)
+
+        # then, run the question answering chain on the event loop, with the
+        # combine-docs model picked for this question. Identical questions that
+        # are already being answered share that run instead of starting their own.
+        async def run_chain() -> tuple[dict[str, Any], UUID, str]:
+            route = route_question(request.prompt, request.messages)
+            logger.info("Routing request %s to %s", request.uuid, route)
+            chains = await answer_question_chains.aget()
+
+            async with answer_semaphore:
+                with callbacks.collect_runs() as cb:
+                    result = await chains[route].acall(
+                        {
+                            "question": request.prompt,
+                            "chat_history": [],
+                            "messages": request.messages,
+                        },
+                        callbacks=chain_callbacks,
+                        metadata={"request_id": str(request.uuid)},
+                    )
+                    return result, cb.traced_runs[0].id, route
+
+        if AnswerConfig.coalesce_enabled:
+            key = question_key(request.prompt, request.messages)
+            chain_result, ran = await single_flight.do(key, run_chain)
+            if not ran:
+                logger.info("Request %s joined an identical question", request.uuid)
+        else:
+            chain_result, ran = await run_chain(), True
+        result, request.langchain_run_id, request.route = chain_result
 
         logger.info("Question answering chain finished with result %s", result)
 
@@ -54,17 +107,62 @@ async def answer_question(request: AskAstroRequest):
             if doc.metadata.get("docLink", "").startswith("https://")
         ]
 
-        await firestore_client.collection(FirestoreCollections.requests).document(
-            str(request.uuid)
-        ).set(request.to_firestore())
+        await store.save(request)
+
+        # the request that ran the chain caches the answer for all of them
+        if use_cache and ran:
+            try:
+                await answer_cache.store(request, prompt_vector)
+            except Exception as exc:
+                logger.warning(
+                    "Failed to add request %s to the semantic cache",
+                    request.uuid,
+                    exc_info=exc,
+                )
 
     except Exception as e:
         # if there's an error, mark the request as errored and add it to the database
         request.status = "error"
         request.response = "Sorry, something went wrong. Please try again later."
-        await firestore_client.collection(FirestoreCollections.requests).document(
-            str(request.uuid)
-        ).set(request.to_firestore())
+        await store.save(request)
 
         # then propogate the error
         raise e
+
+    finally:
+        # let stream subscribers know about the outcome
+        await close_stream(request)
+
+
+async def answer_from_cache(
+    request: AskAstroRequest,
+) -> tuple[bool, np.ndarray | None]:
+    """
+    Completes the request from the semantic answer cache. Returns whether the
+    request was answered, and the embedding of its prompt if it was computed.
+    """
+    try:
+        cached, vector = await answer_cache.lookup(request)
+    except Exception as exc:
+        # a cache failure should never prevent us from answering the question
+        logger.warning(
+            "Semantic cache lookup failed for request %s", request.uuid, exc_info=exc
+        )
+        return False, None
+
+    logger.info("Semantic cache stats: %s", answer_cache.stats())
+    if cached is None:
+        return False, vector
+
+    request.status = "complete"
+    request.response = cached.response
+    request.sources = cached.sources
+    # no chain ran for this request, so its feedback can't be attributed to the
+    # run that answered the original question
+    request.langchain_run_id = None
+    request.route = "semantic_cache"
+    request.response_received_at = int(time.time())
+
+    await (await request_store.aget()).save(request)
+
+    return True, vector
@@ -0,0 +1,135 @@
+"Warms up connections at server start, and reports whether the instance is ready"
+import asyncio
+import time
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+import openai
+
+from ask_astro.config import FirestoreCollections, WeaviateConfig
+from ask_astro.chains.answer_question import answer_question_chains
+from ask_astro.clients.firestore import firestore_client
+from ask_astro.clients.http import get_http_session
+from ask_astro.clients.tokenizers import get_encoding
+from ask_astro.clients.weaviate_ import embeddings
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class ProbeResult:
+    ok: bool
+    latency_ms: float
+    error: str | None = None
+
+
+async def probe_chains():
+    "Builds the answering chains, along with the Weaviate and OpenAI clients."
+    await answer_question_chains.aget()
+
+
+async def probe_firestore():
+    client = await firestore_client.aget()
+    await client.collection(FirestoreCollections.requests).limit(1).get()
+
+
+async def probe_weaviate():
+    async with get_http_session().get(
+        f"{WeaviateConfig.url}/v1/meta",
+        headers={"Authorization": f"Bearer {WeaviateConfig.api_key}"},
+    ) as response:
+        response.raise_for_status()
+
+
+async def probe_embeddings():
+    # bypass the embedding cache, so that the connection is actually opened
+    await (await embeddings.aget()).underlying.aembed_query("warm up")
+
+
+async def probe_tokenizer():
+    # loads the encoding used to pack documents into the prompt from the cache
+    await asyncio.to_thread(get_encoding, "cl100k_base")
+
+
+class Readiness:
+    """
+    Warms up the connections and caches that the first questions would otherwise
+    pay for, and tracks whether this instance is ready to receive traffic.
+    """
+
+    def __init__(self, probes: dict[str, Callable[[], Awaitable[Any]]]):
+        self.probes = probes
+        self.results: dict[str, ProbeResult] = {}
+        self.ready = False
+
+    async def probe(
+        self, fn: Callable[[], Awaitable[Any]], timeout: float
+    ) -> ProbeResult:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(fn(), timeout)
+        except Exception as exc:
+            return ProbeResult(
+                ok=False,
+                latency_ms=round((time.perf_counter() - start) * 1000),
+                error=repr(exc),
+            )
+        return ProbeResult(
+            ok=True, latency_ms=round((time.perf_counter() - start) * 1000)
+        )
+
+    async def warm_up(self, timeout: float):
+        "Runs all probes concurrently. The instance is ready if they all succeed."
+        # send the OpenAI calls over the shared connection pool that requests use
+        openai.aiosession.set(get_http_session())
+
+        results = await asyncio.gather(
+            *(self.probe(fn, timeout) for fn in self.probes.values())
+        )
+        self.results = dict(zip(self.probes, results))
+        self.ready = all(result.ok for result in results)
+
+        for name, result in self.results.items():
+            if result.ok:
+                logger.info("Warmed up %s in %dms", name, result.latency_ms)
+            else:
+                logger.warning("Failed to warm up %s: %s", name, result.error)
+
+    async def run(self, timeout: float, retry_seconds: float):
+        "Warms up until every probe succeeds."
+        while True:
+            await self.warm_up(timeout)
+            if self.ready:
+                return
+            await asyncio.sleep(retry_seconds)
+
+    def mark_ready(self):
+        "Marks the instance as ready without warming up."
+        self.ready = True
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "probes": {
+                name: {
+                    "ok": result.ok,
+                    "latency_ms": result.latency_ms,
+                    "error": result.error,
+                }
+                for name, result in self.results.items()
+            },
+        }
+
+
+readiness = Readiness(
+    {
+        "chains": probe_chains,
+        "firestore": probe_firestore,
+        "weaviate": probe_weaviate,
+        "embeddings": probe_embeddings,
+        "tokenizer": probe_tokenizer,
+    }
+)
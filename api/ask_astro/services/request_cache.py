@@ -0,0 +1,89 @@
+"Cache of the responses to GET requests for answered requests"
+import hashlib
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from ask_astro.config import RequestCacheConfig
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+@dataclass
+class CachedRequest:
+    "The serialized response for a request, along with its ETag."
+    body: bytes
+    etag: str
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class RequestCache:
+    """
+    Caches the serialized documents of answered requests, which only change when
+    feedback is submitted. Entries are invalidated when this process saves the
+    request or its feedback, and expire after `ttl_seconds` otherwise.
+    """
+
+    def __init__(self, *, enabled: bool, ttl_seconds: int, max_entries: int):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, CachedRequest] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def get(self, request_id: str) -> CachedRequest | None:
+        entry = self.entries.get(request_id)
+        if entry is not None and time.monotonic() - entry.created_at > self.ttl_seconds:
+            del self.entries[request_id]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(request_id)
+        return entry
+
+    def store(self, request_id: str, body: bytes) -> CachedRequest:
+        entry = CachedRequest(body=body, etag=make_etag(body))
+        if not self.enabled:
+            return entry
+
+        self.entries[request_id] = entry
+        self.entries.move_to_end(request_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, request_id: str):
+        if self.entries.pop(request_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict[str, int | float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+        }
+
+
+request_cache = RequestCache(
+    enabled=RequestCacheConfig.enabled,
+    ttl_seconds=RequestCacheConfig.ttl_seconds,
+    max_entries=RequestCacheConfig.max_entries,
+)
@@ -0,0 +1,64 @@
+"Saves the requests being answered, and their conversations, to the database"
+
+from langchain.schema import BaseMessage
+
+from ask_astro.config import (
+    ConversationConfig,
+    FirestoreCollections,
+    RequestStoreConfig,
+)
+from ask_astro.clients.firestore import firestore_client
+from ask_astro.container import Lazy
+from ask_astro.models.request import AskAstroRequest
+from ask_astro.services.request_cache import request_cache
+from ask_astro.services.watchers import request_watcher
+from ask_astro.stores.conversation_store import ConversationStore
+from ask_astro.stores.request_store import RequestStore
+
+
+def on_request_saved(request: AskAstroRequest):
+    request_cache.invalidate(str(request.uuid))
+    request_watcher.on_save(request)
+
+
+request_store: Lazy[RequestStore] = Lazy(
+    "request_store",
+    lambda: RequestStore(
+        client=firestore_client.get(),
+        collection=FirestoreCollections.requests,
+        write_behind=RequestStoreConfig.write_behind,
+        flush_interval=RequestStoreConfig.flush_interval,
+        on_save=on_request_saved,
+    ),
+)
+
+conversation_store: Lazy[ConversationStore] = Lazy(
+    "conversation_store",
+    lambda: ConversationStore(
+        client=firestore_client.get(),
+        collection=FirestoreCollections.conversations,
+        cache_size=ConversationConfig.cache_size,
+    ),
+)
+
+
+async def load_history(request: AskAstroRequest):
+    """
+    Rebuilds the messages of a request that follows up on a conversation, from
+    the turns that came before it.
+    """
+    if request.conversation_id is None or request.messages:
+        return
+
+    request.messages = await conversation_messages(
+        request.conversation_id, request.turn_index
+    )
+
+
+async def conversation_messages(
+    conversation_id: str, turn_index: int
+) -> list[BaseMessage]:
+    "Returns the messages of the turns of a conversation before `turn_index`."
+    store = await conversation_store.aget()
+    turns = await store.history(conversation_id, turn_index)
+    return [message for turn in turns for message in turn.to_messages()]
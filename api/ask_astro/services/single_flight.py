@@ -0,0 +1,97 @@
+"Coalesces identical questions that are being answered at the same time"
+import asyncio
+import hashlib
+import json
+import re
+
+from typing import Any, Awaitable, Callable, TypeVar
+
+from langchain.schema import BaseMessage
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def normalize_prompt(prompt: str) -> str:
+    "Ignores case, whitespace and trailing punctuation, e.g. `What is a DAG?`"
+    return re.sub(r"\s+", " ", prompt).strip().rstrip("?!. ").lower()
+
+
+def conversation_fingerprint(messages: list[BaseMessage]) -> str:
+    "Identifies the conversation a question is asked in, by its messages."
+    return hashlib.sha256(
+        json.dumps([[message.type, message.content] for message in messages]).encode()
+    ).hexdigest()
+
+
+def question_key(prompt: str, messages: list[BaseMessage]) -> str:
+    return hashlib.sha256(
+        f"{normalize_prompt(prompt)}\0{conversation_fingerprint(messages)}".encode()
+    ).hexdigest()
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time. Callers that ask for a key
+    that is already being computed wait for that computation and share its result
+    (or exception), instead of starting their own. If the caller running it is
+    cancelled, the callers waiting on it run `fn` again, one of them as the new
+    leader.
+    """
+
+    def __init__(self):
+        self.in_flight: dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """
+        Returns the result of `fn`, or of the computation already in flight for the
+        key, along with whether this call ran `fn` itself.
+        """
+        if key in self.in_flight:
+            self.followers += 1
+            future = self.in_flight[key]
+            try:
+                # shielded, so that a follower going away doesn't cancel the leader
+                return await asyncio.shield(future), False
+            except asyncio.CancelledError:
+                # only this follower's own cancellation is propagated
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            logger.info("Leader of %s was cancelled, retrying", key)
+            # counted again by the retry, as a leader or a follower
+            self.followers -= 1
+            return await self.do(key, fn)
+
+        self.leaders += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # followers re-raise it themselves, don't warn if there are none
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            del self.in_flight[key]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self.in_flight),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+
+single_flight = SingleFlight()
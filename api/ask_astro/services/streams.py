@@ -0,0 +1,124 @@
+"Streams answer tokens from the question answering chain to subscribers"
+import asyncio
+
+from typing import Any, AsyncIterator
+from uuid import UUID
+
+from langchain.callbacks.base import AsyncCallbackHandler
+
+from ask_astro.models.request import AskAstroRequest
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# the tag set on the LLM whose tokens are streamed to the user
+STREAMED_LLM_TAG = "combine_docs"
+
+# the events that end a stream
+FINAL_EVENTS = ("complete", "error")
+
+
+class AnswerStream:
+    """
+    Buffers the events of a single request so that subscribers that connect late
+    still receive every token.
+    """
+
+    def __init__(self):
+        self.events: list[tuple[str, dict[str, Any]]] = []
+        self._condition = asyncio.Condition()
+        self.expiry: asyncio.TimerHandle | None = None
+
+    async def publish(self, event: str, data: dict[str, Any]):
+        async with self._condition:
+            self.events.append((event, data))
+            self._condition.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        "Yields every event of the stream, up to and including the final one."
+        index = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: len(self.events) > index)
+                events = self.events[index:]
+            index += len(events)
+
+            for event, data in events:
+                yield event, data
+                if event in FINAL_EVENTS:
+                    return
+
+
+class AnswerStreamHandler(AsyncCallbackHandler):
+    "Publishes the tokens of the combine-docs LLM to an answer stream."
+
+    def __init__(self, stream: AnswerStream):
+        self.stream = stream
+
+    async def on_llm_new_token(
+        self, token: str, *, tags: list[str] | None = None, **kwargs: Any
+    ) -> None:
+        if tags and STREAMED_LLM_TAG in tags:
+            await self.stream.publish("token", {"token": token})
+
+
+# streams of the requests being answered by this instance
+answer_streams: dict[UUID, AnswerStream] = {}
+
+
+# the final events of expired streams being published
+expiring: set[asyncio.Task] = set()
+
+
+def open_stream(request_uuid: UUID) -> AnswerStream:
+    return answer_streams.setdefault(request_uuid, AnswerStream())
+
+
+def expire_stream(request_uuid: UUID, timeout: float):
+    """
+    Ends the request's stream with an error if it's still open after `timeout`
+    seconds, e.g. because its job was dropped, so that its subscribers don't
+    wait forever.
+    """
+    stream = answer_streams.get(request_uuid)
+    if stream is None:
+        return
+
+    def expire():
+        if answer_streams.get(request_uuid) is not stream:
+            return
+        del answer_streams[request_uuid]
+        logger.warning("Stream of request %s timed out", request_uuid)
+        task = asyncio.create_task(
+            stream.publish(
+                "error",
+                {
+                    "status": "error",
+                    "response": "Sorry, the answer took too long. Please try again.",
+                },
+            )
+        )
+        expiring.add(task)
+        task.add_done_callback(expiring.discard)
+
+    stream.expiry = asyncio.get_running_loop().call_later(timeout, expire)
+
+
+async def close_stream(request: AskAstroRequest):
+    "Publishes the final state of the request and stops tracking its stream."
+    stream = answer_streams.pop(request.uuid, None)
+    if stream is None:
+        return
+    if stream.expiry is not None:
+        stream.expiry.cancel()
+
+    await stream.publish(
+        "complete" if request.status == "complete" else "error",
+        {
+            "status": request.status,
+            "response": request.response,
+            "sources": [source.to_firestore() for source in request.sources],
+            "langchain_run_id": str(request.langchain_run_id),
+        },
+    )
@@ -0,0 +1,196 @@
+"Lets long-polling clients wait for requests to change"
+import asyncio
+import functools
+import time
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from ask_astro.config import FirestoreCollections, JobQueueConfig, LongPollConfig
+from ask_astro.clients.firestore import firestore_sync_client
+from ask_astro.container import Lazy
+from ask_astro.models.request import AskAstroRequest
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+FINAL_STATUSES = ("complete", "error")
+
+
+class Subscription:
+    "Receives the changes to one request."
+
+    def __init__(self):
+        self.latest: dict[str, Any] | None = None
+        self.changed = asyncio.Event()
+
+    def publish(self, data: dict[str, Any]):
+        self.latest = data
+        self.changed.set()
+
+    async def wait_for_change(
+        self, status: str, timeout: float
+    ) -> dict[str, Any] | None:
+        """
+        Returns the request once its status is no longer `status`, or None if it
+        didn't change within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while self.latest is None or self.latest.get("status") == status:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+        return self.latest
+
+
+class RequestWatcher:
+    """
+    Publishes changes to requests to the clients waiting on them. Requests saved
+    by this process are published as they are saved. Requests that may be
+    answered by another instance are also watched with a Firestore snapshot
+    listener, shared by everyone waiting on the request, and only open while
+    someone is.
+
+    With `jobs_in_process`, requests saved by this process are also answered by
+    it, so they aren't watched. At most `max_listeners` listeners are open at once.
+    """
+
+    def __init__(
+        self, *, listeners_enabled: bool, jobs_in_process: bool, max_listeners: int
+    ):
+        self.listeners_enabled = listeners_enabled
+        self.jobs_in_process = jobs_in_process
+        self.max_listeners = max_listeners
+        self.subscriptions: dict[str, set[Subscription]] = {}
+        # request id -> the listener, once it has been created off the event loop
+        self.listeners: dict[str, asyncio.Future] = {}
+        self.listeners_capped = 0
+        # requests that are being answered in this process
+        self.local: set[str] = set()
+        self.local_changes = 0
+        self.listener_changes = 0
+
+    def publish(self, request_id: str, data: dict[str, Any]):
+        for subscription in self.subscriptions.get(request_id, ()):
+            subscription.publish(data)
+
+    def on_save(self, request: AskAstroRequest):
+        "Publishes a request saved by this process."
+        request_id = str(request.uuid)
+        if request.status in FINAL_STATUSES:
+            self.local.discard(request_id)
+        elif self.jobs_in_process:
+            self.local.add(request_id)
+
+        if request_id in self.subscriptions:
+            self.local_changes += 1
+            self.publish(request_id, request.to_firestore())
+
+    def listen(self, request_id: str):
+        loop = asyncio.get_running_loop()
+
+        # runs on the listener's thread
+        def on_snapshot(snapshots, changes, read_time):
+            for snapshot in snapshots:
+                if snapshot.exists:
+                    loop.call_soon_threadsafe(
+                        self.on_listener_change, request_id, snapshot.to_dict()
+                    )
+
+        def create():
+            return (
+                firestore_sync_client.collection(FirestoreCollections.requests)
+                .document(request_id)
+                .on_snapshot(on_snapshot)
+            )
+
+        # starting the listener's thread and stream blocks, so keep it off the
+        # event loop. its first snapshot publishes the request as it is by then.
+        listener = asyncio.ensure_future(asyncio.to_thread(create))
+        listener.add_done_callback(
+            functools.partial(self.on_listener_created, request_id)
+        )
+        self.listeners[request_id] = listener
+
+    def on_listener_created(self, request_id: str, listener: asyncio.Future):
+        if listener.cancelled():
+            return
+        if listener.exception() is not None:
+            logger.warning(
+                "Failed to listen to request %s",
+                request_id,
+                exc_info=listener.exception(),
+            )
+            if self.listeners.get(request_id) is listener:
+                del self.listeners[request_id]
+        elif self.listeners.get(request_id) is not listener:
+            # everyone stopped waiting while it was being created
+            self.unsubscribe(listener)
+
+    def on_listener_change(self, request_id: str, data: dict[str, Any]):
+        self.listener_changes += 1
+        self.publish(request_id, data)
+
+    def stop_listening(self, request_id: str):
+        listener = self.listeners.pop(request_id, None)
+        # listeners still being created are unsubscribed once they are
+        if listener is not None and listener.done():
+            self.unsubscribe(listener)
+
+    @staticmethod
+    def unsubscribe(listener: asyncio.Future):
+        if listener.cancelled() or listener.exception() is not None:
+            return
+        # joins the listener's thread, so keep it off the event loop
+        asyncio.get_running_loop().run_in_executor(None, listener.result().unsubscribe)
+
+    @asynccontextmanager
+    async def subscribe(self, request_id: str) -> AsyncIterator[Subscription]:
+        """
+        Subscribes to the changes of a request. Subscribe before reading the
+        request, so that no change is missed in between.
+        """
+        subscription = Subscription()
+        self.subscriptions.setdefault(request_id, set()).add(subscription)
+        try:
+            if (
+                self.listeners_enabled
+                and request_id not in self.local
+                and request_id not in self.listeners
+            ):
+                if len(self.listeners) < self.max_listeners:
+                    self.listen(request_id)
+                else:
+                    self.listeners_capped += 1
+            yield subscription
+        finally:
+            subscriptions = self.subscriptions[request_id]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[request_id]
+                self.stop_listening(request_id)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "waiting": sum(len(s) for s in self.subscriptions.values()),
+            "listeners": len(self.listeners),
+            "listeners_capped": self.listeners_capped,
+            "local_changes": self.local_changes,
+            "listener_changes": self.listener_changes,
+        }
+
+
+request_watcher: Lazy[RequestWatcher] = Lazy(
+    "request_watcher",
+    lambda: RequestWatcher(
+        listeners_enabled=LongPollConfig.listeners_enabled,
+        jobs_in_process=JobQueueConfig.backend == "memory",
+        max_listeners=LongPollConfig.max_listeners,
+    ),
+)
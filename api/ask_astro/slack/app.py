@@ -4,45 +4,62 @@ from slack_bolt.oauth.async_oauth_settings import AsyncOAuthSettings
 from slack_bolt.adapter.sanic import AsyncSlackRequestHandler
 from slack_bolt.app.async_app import AsyncApp
 
+from ask_astro.clients.firestore import firestore_client
 from ask_astro.config import SlackAppConfig, FirestoreCollections
+from ask_astro.container import Lazy
+from ask_astro.slack.controllers import register_controllers
 from ask_astro.stores import (
     AsyncFirestoreInstallationStore,
     AsyncFirestoreOAuthStateStore,
 )
 
 
-oauth_settings = AsyncOAuthSettings(
-    client_id=SlackAppConfig.client_id,
-    client_secret=SlackAppConfig.client_secret,
-    scopes=[
-        "commands",
-        "app_mentions:read",
-        "channels:read",
-        "channels:history",
-        "groups:read",
-        "groups:history",
-        "chat:write",
-        "reactions:read",
-        "reactions:write",
-        "users:read",
-        "users:read.email",
-        "team:read",
-        "im:history",
-        "mpim:history",
-        "files:read",
-    ],
-    installation_store=AsyncFirestoreInstallationStore(
-        collection=FirestoreCollections.installation_store,
-    ),
-    state_store=AsyncFirestoreOAuthStateStore(
-        expiration_seconds=600,
-        collection=FirestoreCollections.state_store,
-    ),
-)
+def build_slack_app() -> AsyncApp:
+    "Builds the slack app, with all controllers registered."
+    oauth_settings = AsyncOAuthSettings(
+        client_id=SlackAppConfig.client_id,
+        client_secret=SlackAppConfig.client_secret,
+        scopes=[
+            "commands",
+            "app_mentions:read",
+            "channels:read",
+            "channels:history",
+            "groups:read",
+            "groups:history",
+            "chat:write",
+            "reactions:read",
+            "reactions:write",
+            "users:read",
+            "users:read.email",
+            "team:read",
+            "im:history",
+            "mpim:history",
+            "files:read",
+        ],
+        installation_store=AsyncFirestoreInstallationStore(
+            collection=FirestoreCollections.installation_store,
+            client=firestore_client,
+            cache_ttl_seconds=SlackAppConfig.installation_cache_ttl_seconds,
+            negative_cache_ttl_seconds=(
+                SlackAppConfig.installation_negative_cache_ttl_seconds
+            ),
+        ),
+        state_store=AsyncFirestoreOAuthStateStore(
+            expiration_seconds=600,
+            collection=FirestoreCollections.state_store,
+            client=firestore_client,
+        ),
+    )
+
+    app = AsyncApp(
+        signing_secret=SlackAppConfig.signing_secret,
+        oauth_settings=oauth_settings,
+    )
+    register_controllers(app)
+    return app
 
 
-slack_app = AsyncApp(
-    signing_secret=SlackAppConfig.signing_secret,
-    oauth_settings=oauth_settings,
+slack_app: Lazy[AsyncApp] = Lazy("slack_app", build_slack_app)
+app_handler: Lazy[AsyncSlackRequestHandler] = Lazy(
+    "slack_app_handler", lambda: AsyncSlackRequestHandler(slack_app.get())
 )
-app_handler = AsyncSlackRequestHandler(slack_app)
@@ -1,4 +1,13 @@
 "Re-exports stores for easier importing."
 
+from .conversation_store import ConversationStore
 from .installation_store import AsyncFirestoreInstallationStore
 from .oauth_state_store import AsyncFirestoreOAuthStateStore
+from .request_store import RequestStore
+from .job_queues import (
+    FirestoreJobQueue,
+    InMemoryJobQueue,
+    Job,
+    JobQueue,
+    SQLiteJobQueue,
+)
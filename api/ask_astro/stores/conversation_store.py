@@ -0,0 +1,141 @@
+"""
+Stores each turn of a conversation once, instead of copying the whole history into
+every follow-up request.
+
+Turns are kept in a `turns` subcollection of the conversation's document, keyed
+by their index. The turns of recently active conversations are cached, so that
+the history of a follow-up is rebuilt from the cached tail plus the turns that
+were added since.
+"""
+import time
+import uuid
+
+from collections import OrderedDict
+
+import google.cloud.firestore
+
+from ask_astro.models.conversation import Turn
+from ask_astro.models.request import AskAstroRequest
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        *,
+        client: google.cloud.firestore.AsyncClient,
+        collection: str,
+        cache_size: int,
+    ):
+        self.client = client
+        self.collection = client.collection(collection)
+        self.cache_size = cache_size
+        # conversation id -> its first turns, in order
+        self.cache: OrderedDict[str, list[Turn]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def turns_collection(self, conversation_id: str):
+        return self.collection.document(conversation_id).collection("turns")
+
+    def cache_turns(self, conversation_id: str, turns: list[Turn]):
+        self.cache[conversation_id] = turns
+        self.cache.move_to_end(conversation_id)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def history(self, conversation_id: str, up_to: int) -> list[Turn]:
+        "Returns the first `up_to` turns of the conversation."
+        cached = self.cache.get(conversation_id, [])
+        if len(cached) >= up_to:
+            self.hits += 1
+            self.cache_turns(conversation_id, cached)
+            return cached[:up_to]
+
+        # only fetch the turns that aren't cached yet
+        self.misses += 1
+        snapshots = await (
+            self.turns_collection(conversation_id)
+            .where("index", ">=", len(cached))
+            .where("index", "<", up_to)
+            .order_by("index")
+            .get()
+        )
+        turns = cached + [Turn.from_dict(snapshot.to_dict()) for snapshot in snapshots]
+        self.cache_turns(conversation_id, turns)
+        return turns
+
+    async def write_turns(self, conversation_id: str, turns: list[Turn]):
+        batch = self.client.batch()
+        for turn in turns:
+            batch.set(
+                self.turns_collection(conversation_id).document(f"{turn.index:06d}"),
+                turn.to_firestore(),
+            )
+        batch.set(
+            self.collection.document(conversation_id),
+            {"turn_count": turns[-1].index + 1, "updated_at": int(time.time())},
+            merge=True,
+        )
+        await batch.commit()
+
+        cached = self.cache.get(conversation_id)
+        if cached is not None and len(cached) == turns[0].index:
+            self.cache_turns(conversation_id, cached + turns)
+
+    async def continue_from(self, request: AskAstroRequest) -> tuple[str, int]:
+        """
+        Records the request's turn in its conversation, and returns the id of the
+        conversation and the turn index of a follow-up to the request.
+
+        A request that isn't part of a conversation yet starts one, seeded with
+        the history it was stored with. Following up on a request whose turn was
+        already followed up differently forks the conversation.
+        """
+        turn = Turn(
+            index=0,
+            request_uuid=str(request.uuid),
+            prompt=request.prompt,
+            response=request.response,
+            sent_at=request.sent_at,
+            response_received_at=request.response_received_at,
+        )
+
+        if request.conversation_id is None:
+            conversation_id = str(request.uuid)
+            history = Turn.from_messages(request.messages)
+        else:
+            conversation_id = request.conversation_id
+            history = await self.history(conversation_id, request.turn_index)
+        turn.index = len(history)
+
+        existing = await self.history(conversation_id, turn.index + 1)
+        if len(existing) > turn.index:
+            if existing[turn.index].request_uuid == turn.request_uuid:
+                # the request was already followed up
+                return conversation_id, turn.index + 1
+
+            # the conversation continued differently after this turn
+            conversation_id = str(uuid.uuid4())
+            logger.info(
+                "Forking conversation %s into %s",
+                request.conversation_id,
+                conversation_id,
+            )
+            await self.write_turns(conversation_id, history + [turn])
+        elif request.conversation_id is None:
+            await self.write_turns(conversation_id, history + [turn])
+        else:
+            await self.write_turns(conversation_id, [turn])
+
+        return conversation_id, turn.index + 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "conversations_cached": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
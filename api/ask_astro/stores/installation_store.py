@@ -1,6 +1,7 @@
 import logging
+import time
 from logging import Logger
-from typing import Optional
+from typing import Any, Optional
 
 import google.cloud.firestore
 
@@ -12,20 +13,45 @@ from slack_sdk.oauth.installation_store.models.installation import Installation
 
 
 class AsyncFirestoreInstallationStore(AsyncInstallationStore):
+    """
+    Stores Slack installations in Firestore, one document per workspace.
+
+    Bolt looks up the installation to authorize every event, so lookups are cached
+    for `cache_ttl_seconds`, and lookups of missing installations for
+    `negative_cache_ttl_seconds`. Saving or deleting an installation invalidates
+    the cached lookups of its workspace, and lookups that were reading it at the
+    time aren't cached.
+    """
+
     def __init__(
         self,
         *,
         collection: str,
+        client: Optional[google.cloud.firestore.AsyncClient] = None,
         historical_data_enabled: bool = True,
         client_id: Optional[str] = None,
         logger: Logger = logging.getLogger(__name__),
+        cache_ttl_seconds: float = 300,
+        negative_cache_ttl_seconds: float = 30,
     ):
-        firestore_client = google.cloud.firestore.AsyncClient()
-        self.fp = firestore_client.field_path
-        self.collection = firestore_client.collection(collection)
+        # the client is only used once the store is, so it can be created lazily
+        self.firestore_client = client or google.cloud.firestore.AsyncClient()
+        self.fp = google.cloud.firestore.AsyncClient.field_path
+        self.collection_name = collection
         self.historical_data_enabled = historical_data_enabled
         self.client_id = client_id
         self._logger = logger
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.negative_cache_ttl_seconds = negative_cache_ttl_seconds
+        # document id -> (kind, user id) -> (expiry, Bot or Installation or None)
+        self._cache: dict[str, dict[tuple[str, Optional[str]], tuple[float, Any]]] = {}
+        # document id -> how many times its lookups were invalidated
+        self._generations: dict[str, int] = {}
+        self._next_prune = time.monotonic() + cache_ttl_seconds
+
+    @property
+    def collection(self) -> google.cloud.firestore.AsyncCollectionReference:
+        return self.firestore_client.collection(self.collection_name)
 
     @property
     def logger(self) -> Logger:
@@ -33,6 +59,53 @@ class AsyncFirestoreInstallationStore(AsyncInstallationStore):
             self._logger = logging.getLogger(__name__)
         return self._logger
 
+    def _cached(self, doc_id: str, key: tuple[str, Optional[str]]) -> tuple[bool, Any]:
+        "Returns whether the lookup is cached, and its result."
+        expires_at, value = self._cache.get(doc_id, {}).get(key, (0, None))
+        if expires_at < time.monotonic():
+            return False, None
+        return True, value
+
+    def _cache_result(
+        self,
+        doc_id: str,
+        key: tuple[str, Optional[str]],
+        value: Any,
+        generation: int,
+    ):
+        # the document was written while it was read, so the value may be stale
+        if self._generations.get(doc_id, 0) != generation:
+            return
+
+        now = time.monotonic()
+        if now >= self._next_prune:
+            self._prune(now)
+
+        ttl = (
+            self.cache_ttl_seconds
+            if value is not None
+            else self.negative_cache_ttl_seconds
+        )
+        self._cache.setdefault(doc_id, {})[key] = (now + ttl, value)
+
+    def _prune(self, now: float):
+        "Drops the expired lookups, e.g. of workspaces that uninstalled the app."
+        for doc_id in list(self._cache):
+            entries = self._cache[doc_id]
+            for key in [
+                key for key, (expires_at, _) in entries.items() if expires_at < now
+            ]:
+                del entries[key]
+            if not entries:
+                del self._cache[doc_id]
+        self._next_prune = now + self.cache_ttl_seconds
+
+    def _invalidate(self, enterprise_id: Optional[str], team_id: Optional[str]):
+        none = "none"
+        doc_id = f"{enterprise_id or none}-{team_id or none}"
+        self._cache.pop(doc_id, None)
+        self._generations[doc_id] = self._generations.get(doc_id, 0) + 1
+
     async def async_save(self, installation: Installation):
         none = "none"
         e_id = installation.enterprise_id or none
@@ -75,6 +148,9 @@ class AsyncFirestoreInstallationStore(AsyncInstallationStore):
                 {self.fp("installer", u_id, "latest"): entity},
             )
 
+        # after writing, so that no lookup caches what was there before
+        self._invalidate(installation.enterprise_id, installation.team_id)
+
     async def async_save_bot(self, bot: Bot):
         none = "none"
         e_id = bot.enterprise_id or none
@@ -97,6 +173,8 @@ class AsyncFirestoreInstallationStore(AsyncInstallationStore):
                 {self.fp("bot", "latest"): entity},
             )
 
+        self._invalidate(bot.enterprise_id, bot.team_id)
+
     async def async_find_bot(
         self,
         *,
@@ -110,14 +188,23 @@ class AsyncFirestoreInstallationStore(AsyncInstallationStore):
         if is_enterprise_install:
             t_id = none
 
-        doc_ref = self.collection.document(f"{e_id}-{t_id}")
+        doc_id = f"{e_id}-{t_id}"
+        cached, bot = self._cached(doc_id, ("bot", None))
+        if cached:
+            return bot
+
+        generation = self._generations.get(doc_id, 0)
+        doc_ref = self.collection.document(doc_id)
 
         if data := (await doc_ref.get([self.fp("bot", "latest")])).to_dict():
-            return Bot(**data["bot"]["latest"])
+            bot = Bot(**data["bot"]["latest"])
         else:
             message = f"Installation data missing for enterprise: {e_id}, team: {t_id}"
             self.logger.debug(message)
-            return None
+            bot = None
+
+        self._cache_result(doc_id, ("bot", None), bot, generation)
+        return bot
 
     async def async_find_installation(
         self,
@@ -133,23 +220,41 @@ class AsyncFirestoreInstallationStore(AsyncInstallationStore):
         if is_enterprise_install:
             t_id = none
 
-        doc_ref = self.collection.document(f"{e_id}-{t_id}")
+        doc_id = f"{e_id}-{t_id}"
+        cached, installation = self._cached(doc_id, ("installation", user_id))
+        if cached:
+            return installation
+
+        generation = self._generations.get(doc_id, 0)
+        installation = await self._async_find_installation(
+            doc_id=doc_id,
+            enterprise_id=enterprise_id,
+            team_id=team_id,
+            user_id=user_id,
+            is_enterprise_install=is_enterprise_install,
+        )
+        self._cache_result(doc_id, ("installation", user_id), installation, generation)
+        return installation
+
+    async def _async_find_installation(
+        self,
+        *,
+        doc_id: str,
+        enterprise_id: Optional[str],
+        team_id: Optional[str],
+        user_id: Optional[str],
+        is_enterprise_install: Optional[bool],
+    ) -> Optional[Installation]:
+        doc_ref = self.collection.document(doc_id)
 
         if user_id:
-            data = (
-                (await doc_ref.get([self.fp("installer", user_id, "latest")]))
-                .to_dict()
-                .get("installer", {})
-                .get(user_id, {})
-                .get("latest")
-            )
+            doc = await doc_ref.get([self.fp("installer", user_id, "latest")])
+            # the document doesn't exist if the workspace never installed the app
+            data = (doc.to_dict() or {}).get("installer", {}).get(user_id, {})
+            data = data.get("latest")
         else:
-            data = (
-                (await doc_ref.get([self.fp("installer", "latest")]))
-                .to_dict()
-                .get("installer", {})
-                .get("latest")
-            )
+            doc = await doc_ref.get([self.fp("installer", "latest")])
+            data = (doc.to_dict() or {}).get("installer", {}).get("latest")
 
         if data:
             installation = Installation(**data) if data else None
@@ -182,7 +287,7 @@ class AsyncFirestoreInstallationStore(AsyncInstallationStore):
 
             return installation
         else:
-            message = f"Installation data missing for enterprise: {e_id}, team: {t_id}"
+            message = f"Installation data missing for {doc_id}"
             self.logger.debug(message)
             return None
 
@@ -194,6 +299,7 @@ class AsyncFirestoreInstallationStore(AsyncInstallationStore):
         t_id = team_id or none
         doc_ref = self.collection.document(f"{e_id}-{t_id}")
         await doc_ref.update({"bot": google.cloud.firestore.DELETE_FIELD})
+        self._invalidate(enterprise_id, team_id)
 
     async def async_delete_installation(
         self,
@@ -207,3 +313,4 @@ class AsyncFirestoreInstallationStore(AsyncInstallationStore):
         t_id = team_id or none
         doc_ref = self.collection.document(f"{e_id}-{t_id}")
         await doc_ref.update({"installer": google.cloud.firestore.DELETE_FIELD})
+        self._invalidate(enterprise_id, team_id)
@@ -0,0 +1,286 @@
+"""
+Durable queues of questions waiting to be answered.
+
+A job becomes available to workers once it's enqueued. Claiming a job leases it
+to a worker until `available_at`; if the worker doesn't complete or extend the
+lease in time, the job becomes available again and is retried, up to
+`max_attempts` times.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, TypeVar
+
+import google.cloud.firestore
+
+T = TypeVar("T")
+
+
+@dataclass
+class Job:
+    "A question waiting to be answered."
+    id: str
+    payload: dict[str, Any]
+    attempts: int = 0
+    enqueued_at: float = 0.0
+    available_at: float = 0.0
+
+
+class JobQueue(ABC):
+    def __init__(self, *, max_attempts: int):
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    async def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        "Adds a job to the queue."
+
+    @abstractmethod
+    async def claim(self, worker_id: str, lease_seconds: float) -> Job | None:
+        """
+        Leases the oldest available job to the worker, or returns None if there
+        are no jobs available.
+        """
+
+    @abstractmethod
+    async def extend(self, job: Job, lease_seconds: float) -> None:
+        "Extends the lease of a job that is still being worked on."
+
+    @abstractmethod
+    async def complete(self, job: Job) -> None:
+        "Removes a finished job from the queue."
+
+    @abstractmethod
+    async def depth(self) -> int:
+        "Returns the number of jobs in the queue, including leased ones."
+
+    async def release(self, job: Job) -> bool:
+        """
+        Makes a failed job available again. Returns False, and removes the job, if
+        it has run out of attempts.
+        """
+        if job.attempts >= self.max_attempts:
+            await self.complete(job)
+            return False
+
+        await self.extend(job, 0)
+        return True
+
+    async def wait(self, timeout: float) -> None:
+        "Waits for new jobs to be enqueued, for at most `timeout` seconds."
+        await asyncio.sleep(timeout)
+
+
+class InMemoryJobQueue(JobQueue):
+    "Keeps jobs in process memory. Jobs are lost if the process restarts."
+
+    def __init__(self, *, max_attempts: int):
+        super().__init__(max_attempts=max_attempts)
+        self.jobs: dict[str, Job] = {}
+        self.enqueued = asyncio.Event()
+
+    async def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        now = time.time()
+        self.jobs[job_id] = Job(
+            id=job_id, payload=payload, enqueued_at=now, available_at=now
+        )
+        self.enqueued.set()
+
+    async def claim(self, worker_id: str, lease_seconds: float) -> Job | None:
+        now = time.time()
+        available = [job for job in self.jobs.values() if job.available_at <= now]
+        if not available:
+            return None
+
+        job = min(available, key=lambda job: job.available_at)
+        job.attempts += 1
+        job.available_at = now + lease_seconds
+        return job
+
+    async def extend(self, job: Job, lease_seconds: float) -> None:
+        if job.id in self.jobs:
+            self.jobs[job.id].available_at = time.time() + lease_seconds
+
+    async def complete(self, job: Job) -> None:
+        self.jobs.pop(job.id, None)
+
+    async def depth(self) -> int:
+        return len(self.jobs)
+
+    async def wait(self, timeout: float) -> None:
+        self.enqueued.clear()
+        try:
+            await asyncio.wait_for(self.enqueued.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Keeps jobs in a local SQLite database, e.g. for local development and tests.
+    Database calls can wait on another process's write lock, so they're made off
+    the event loop, one at a time on the shared connection.
+    """
+
+    def __init__(self, *, path: str, max_attempts: int):
+        super().__init__(max_attempts=max_attempts)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # autocommit mode, so that claims can take an immediate write lock
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db_lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, payload TEXT, attempts INTEGER, "
+            "enqueued_at REAL, available_at REAL)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_available_at ON jobs (available_at)"
+        )
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        "Calls `fn` with the database to itself, on a worker thread."
+
+        def locked() -> T:
+            with self.db_lock:
+                return fn(*args)
+
+        return await asyncio.to_thread(locked)
+
+    async def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        now = time.time()
+        await self.run(
+            self.db.execute,
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, 0, ?, ?)",
+            (job_id, json.dumps(payload), now, now),
+        )
+
+    async def claim(self, worker_id: str, lease_seconds: float) -> Job | None:
+        return await self.run(self.claim_sync, lease_seconds)
+
+    def claim_sync(self, lease_seconds: float) -> Job | None:
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT id, payload, attempts, enqueued_at FROM jobs "
+                "WHERE available_at <= ? ORDER BY available_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            job = Job(
+                id=row[0],
+                payload=json.loads(row[1]),
+                attempts=row[2] + 1,
+                enqueued_at=row[3],
+                available_at=now + lease_seconds,
+            )
+            self.db.execute(
+                "UPDATE jobs SET attempts = ?, available_at = ? WHERE id = ?",
+                (job.attempts, job.available_at, job.id),
+            )
+            return job
+        finally:
+            self.db.execute("COMMIT")
+
+    async def extend(self, job: Job, lease_seconds: float) -> None:
+        job.available_at = time.time() + lease_seconds
+        await self.run(
+            self.db.execute,
+            "UPDATE jobs SET available_at = ? WHERE id = ?",
+            (job.available_at, job.id),
+        )
+
+    async def complete(self, job: Job) -> None:
+        await self.run(self.db.execute, "DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    async def depth(self) -> int:
+        return await self.run(
+            lambda: self.db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        )
+
+
+class FirestoreJobQueue(JobQueue):
+    "Keeps jobs in a Firestore collection, shared by all API and worker instances."
+
+    def __init__(
+        self,
+        *,
+        client: google.cloud.firestore.AsyncClient,
+        collection: str,
+        max_attempts: int,
+    ):
+        super().__init__(max_attempts=max_attempts)
+        self.client = client
+        self.collection = client.collection(collection)
+
+    async def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        now = time.time()
+        await self.collection.document(job_id).set(
+            {
+                "payload": payload,
+                "attempts": 0,
+                "enqueued_at": now,
+                "available_at": now,
+            }
+        )
+
+    async def claim(self, worker_id: str, lease_seconds: float) -> Job | None:
+        now = time.time()
+        candidates = await (
+            self.collection.where("available_at", "<=", now)
+            .order_by("available_at")
+            .limit(5)
+            .get()
+        )
+
+        @google.cloud.firestore.async_transactional
+        async def lease(transaction, doc_ref) -> Job | None:
+            snapshot = await doc_ref.get(transaction=transaction)
+            # another worker may have claimed it since we listed the candidates
+            if not snapshot.exists or snapshot.get("available_at") > now:
+                return None
+
+            data = snapshot.to_dict()
+            job = Job(
+                id=snapshot.id,
+                payload=data["payload"],
+                attempts=data["attempts"] + 1,
+                enqueued_at=data["enqueued_at"],
+                available_at=now + lease_seconds,
+            )
+            transaction.update(
+                doc_ref,
+                {
+                    "attempts": job.attempts,
+                    "available_at": job.available_at,
+                    "leased_by": worker_id,
+                },
+            )
+            return job
+
+        for candidate in candidates:
+            job = await lease(self.client.transaction(), candidate.reference)
+            if job is not None:
+                return job
+        return None
+
+    async def extend(self, job: Job, lease_seconds: float) -> None:
+        job.available_at = time.time() + lease_seconds
+        await self.collection.document(job.id).update(
+            {"available_at": job.available_at}
+        )
+
+    async def complete(self, job: Job) -> None:
+        await self.collection.document(job.id).delete()
+
+    async def depth(self) -> int:
+        result = await self.collection.count().get()
+        return int(result[0][0].value)
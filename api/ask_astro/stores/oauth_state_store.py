@@ -14,16 +14,22 @@ class AsyncFirestoreOAuthStateStore(AsyncOAuthStateStore):
         *,
         collection: str,
         expiration_seconds: int,
+        client: Optional[google.cloud.firestore.AsyncClient] = None,
         client_id: Optional[str] = None,
         logger: Logger = logging.getLogger(__name__),
     ):
-        firestore_client = google.cloud.firestore.AsyncClient()
-        self.collection = firestore_client.collection(collection)
+        # the client is only used once the store is, so it can be created lazily
+        self.firestore_client = client or google.cloud.firestore.AsyncClient()
+        self.collection_name = collection
         self.expiration_seconds = expiration_seconds
 
         self.client_id = client_id
         self._logger = logger
 
+    @property
+    def collection(self) -> google.cloud.firestore.AsyncCollectionReference:
+        return self.firestore_client.collection(self.collection_name)
+
     @property
     def logger(self) -> Logger:
         if self._logger is None:
@@ -0,0 +1,183 @@
+"""
+Persists the lifecycle of requests with as few bytes written as possible.
+
+A request document is created once. Later saves only update the fields that
+changed since the last save, e.g. the status, response and sources, so that the
+conversation history isn't rewritten on every status change.
+"""
+import asyncio
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable
+
+import google.cloud.firestore
+
+from ask_astro.encoding import dumps
+from ask_astro.models.request import AskAstroRequest
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Firestore rejects batches with more writes than this
+MAX_BATCH_SIZE = 500
+
+# how many times a write-behind save is committed before it's dropped
+MAX_FLUSH_ATTEMPTS = 5
+
+
+class RequestStore:
+    """
+    Saves requests to a Firestore collection. In write-behind mode, saves are
+    queued and committed in batches every `flush_interval` seconds, and multiple
+    saves of the same request in that window are merged into one write. Batches
+    that fail to commit are retried with the next flush.
+
+    `on_save` is called with every request saved, e.g. to notify the clients
+    waiting on it.
+    """
+
+    def __init__(
+        self,
+        *,
+        client: google.cloud.firestore.AsyncClient,
+        collection: str,
+        write_behind: bool = False,
+        flush_interval: float = 0.5,
+        on_save: Callable[[AskAstroRequest], None] | None = None,
+    ):
+        self.client = client
+        self.collection = client.collection(collection)
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.on_save = on_save
+        # document id -> (whether it's a create, the fields to write, the number
+        # of failed commits)
+        self.pending: OrderedDict[str, tuple[bool, dict[str, Any], int]] = OrderedDict()
+        self.flusher: asyncio.Task | None = None
+        # set on close, to flush without waiting out the interval
+        self.closing = asyncio.Event()
+        self.writes = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+
+    async def save(self, request: AskAstroRequest, immediate: bool = False):
+        """
+        Creates the request's document, or updates the fields that changed. With
+        `immediate`, the save is written right away even in write-behind mode,
+        e.g. when another process is about to read or update the document.
+        """
+        fields = request.changed_fields()
+        if not fields:
+            return
+
+        create = not request.is_persisted()
+        if self.write_behind and not immediate:
+            self.enqueue(str(request.uuid), create, fields)
+        else:
+            await self.write(str(request.uuid), create, fields)
+        request.mark_persisted()
+
+        if self.on_save is not None:
+            self.on_save(request)
+
+    def enqueue(self, doc_id: str, create: bool, fields: dict[str, Any]):
+        attempts = 0
+        if doc_id in self.pending:
+            pending_create, pending_fields, attempts = self.pending.pop(doc_id)
+            create, fields = pending_create or create, {**pending_fields, **fields}
+        self.pending[doc_id] = (create, fields, attempts)
+
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.create_task(self.flush_periodically())
+
+    async def write(self, doc_id: str, create: bool, fields: dict[str, Any]):
+        start = time.perf_counter()
+        doc_ref = self.collection.document(doc_id)
+        if create:
+            await doc_ref.set(fields)
+        else:
+            await doc_ref.update(fields)
+        self.record(start, [fields])
+
+    async def flush(self):
+        "Commits every pending save, in batches."
+        while self.pending:
+            batch = self.client.batch()
+            taken = []
+            while self.pending and len(taken) < MAX_BATCH_SIZE:
+                doc_id, (create, fields, attempts) = self.pending.popitem(last=False)
+                doc_ref = self.collection.document(doc_id)
+                if create:
+                    batch.set(doc_ref, fields)
+                else:
+                    batch.update(doc_ref, fields)
+                taken.append((doc_id, create, fields, attempts))
+
+            start = time.perf_counter()
+            try:
+                await batch.commit()
+            except BaseException:
+                self.requeue(taken)
+                raise
+            self.record(start, [fields for _, _, fields, _ in taken])
+
+    def requeue(self, taken: list[tuple[str, bool, dict[str, Any], int]]):
+        """
+        Puts the saves of a batch that failed to commit back in front of the
+        pending ones, under the saves of the same requests made since.
+        """
+        for doc_id, create, fields, attempts in reversed(taken):
+            if attempts + 1 >= MAX_FLUSH_ATTEMPTS:
+                self.dropped += 1
+                logger.error(
+                    "Dropped write of request %s after %d attempts",
+                    doc_id,
+                    attempts + 1,
+                )
+                continue
+            if doc_id in self.pending:
+                newer_create, newer_fields, _ = self.pending.pop(doc_id)
+                create, fields = create or newer_create, {**fields, **newer_fields}
+            self.pending[doc_id] = (create, fields, attempts + 1)
+            self.pending.move_to_end(doc_id, last=False)
+
+    async def flush_periodically(self):
+        while self.pending:
+            try:
+                await asyncio.wait_for(self.closing.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error("Failed to flush request writes", exc_info=exc)
+
+    async def close(self):
+        "Flushes pending saves, e.g. before shutting down."
+        self.closing.set()
+        # lets a commit in flight finish rather than cancelling it halfway, and
+        # retries failed batches right away until they're written or dropped
+        if self.flusher is not None:
+            await self.flusher
+
+    def record(self, start: float, written: list[dict[str, Any]]):
+        self.writes += len(written)
+        self.write_seconds += time.perf_counter() - start
+        self.bytes_written += sum(len(dumps(fields)) for fields in written)
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "avg_bytes_per_write": round(self.bytes_written / self.writes)
+            if self.writes
+            else 0,
+            "avg_write_ms": round(self.write_seconds * 1000 / self.writes, 1)
+            if self.writes
+            else 0,
+            "pending": len(self.pending),
+            "dropped": self.dropped,
+        }
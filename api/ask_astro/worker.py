@@ -0,0 +1,43 @@
+"""
+Answers questions from the job queue outside of the API process.
+
+Run with `python -m ask_astro.worker`, and set `JOB_QUEUE_EMBEDDED_WORKERS=false`
+on the API so that it only enqueues questions.
+"""
+import asyncio
+import os
+import logging
+from logging import getLogger
+
+from ask_astro.config import AdmissionConfig, JobQueueConfig
+from ask_astro.clients.http import close_http_session
+from ask_astro.services.jobs import Worker, job_queue
+from ask_astro.services.requests import request_store
+
+# set the logging level based on an env var
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+logger = getLogger(__name__)
+
+
+async def main():
+    if JobQueueConfig.backend == "memory":
+        raise ValueError("Workers can't share an in-memory job queue with the API")
+
+    worker = Worker(job_queue.get(), concurrency=AdmissionConfig.workers)
+    logger.info(
+        "Starting worker %s on the %s job queue", worker.id, JobQueueConfig.backend
+    )
+    try:
+        await worker.run()
+    finally:
+        if request_store.initialized:
+            await request_store.close()
+        await close_http_session()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,81 @@
+"""
+Benchmarks the local reranking stage of the answer chain.
+
+Reports the rerank cost per request and the reduction in prompt tokens from only
+stuffing the top-N reranked documents into the prompt. Run from the api directory:
+
+    python -m benchmarks.rerank
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from langchain.schema import Document
+
+from ask_astro.chains.compressors import LexicalReranker
+from ask_astro.clients.tokenizers import get_encoding
+
+VOCABULARY = (
+    "airflow dag task operator sensor xcom scheduler executor worker pool "
+    "connection variable trigger deferrable retry timeout schedule catchup "
+    "backfill PythonOperator BashOperator KubernetesPodOperator TaskFlow "
+    "AirflowException astro deployment runtime image provider hook"
+).split()
+
+
+def make_documents(n: int, words: int, dimensions: int) -> list[Document]:
+    return [
+        Document(
+            page_content=" ".join(random.choices(VOCABULARY, k=words)),
+            metadata={
+                "docLink": f"https://docs.astronomer.io/{i}",
+                "_additional": {"vector": np.random.rand(dimensions).tolist()},
+            },
+        )
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--candidates", type=int, default=40)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--top-n", type=int, default=8)
+    parser.add_argument("--vector-weight", type=float, default=0.3)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    documents = make_documents(args.candidates, args.words, args.dimensions)
+    query = "How do I retry a PythonOperator task that raises AirflowException?"
+    query_vector = np.random.rand(args.dimensions).tolist()
+
+    for vector_weight in (0.0, args.vector_weight):
+        reranker = LexicalReranker(top_n=args.top_n, vector_weight=vector_weight)
+        reranker.rerank(documents, query, query_vector)  # warm up
+
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            reranked = reranker.rerank(documents, query, query_vector)
+        elapsed = (time.perf_counter() - start) / args.iterations
+
+        print(
+            f"rerank (vector_weight={vector_weight}): "
+            f"{elapsed * 1e6:,.0f}µs per request for {args.candidates} candidates"
+        )
+
+    encoding = get_encoding("cl100k_base")
+    before = sum(len(encoding.encode(doc.page_content)) for doc in documents)
+    after = sum(len(encoding.encode(doc.page_content)) for doc in reranked)
+    print(
+        f"prompt tokens: {before:,} -> {after:,} "
+        f"({1 - after / before:.0%} reduction, top {args.top_n})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmarks encoding and decoding requests.
+
+Compares the slotted AskAstroRequest and orjson with the previous path, which
+validated requests with pydantic, encoded each message with `message.dict()` and
+encoded responses with Sanic's default JSON encoder. Run from the api directory,
+with the app's env vars set:
+
+    python -m benchmarks.serialization
+"""
+import argparse
+import json
+import time
+import uuid
+
+from typing import Any, Callable
+
+from langchain.schema import AIMessage, HumanMessage
+
+from ask_astro.encoding import dumps
+from ask_astro.models.request import (
+    AskAstroRequest,
+    AskAstroRequestSchema,
+    SourceSchema,
+)
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def make_document(messages: int, sources: int, snippet_size: int) -> dict[str, Any]:
+    return {
+        "uuid": str(uuid.uuid4()),
+        "prompt": "How do I retry a PythonOperator task that raises AirflowException?",
+        "messages": [
+            {
+                "content": f"message {i} " * 40,
+                "additional_kwargs": {"ts": 1700000000 + i},
+                "example": False,
+                "type": "human" if i % 2 == 0 else "ai",
+            }
+            for i in range(messages)
+        ],
+        "sources": [
+            {"name": f"https://docs.astronomer.io/{i}", "snippet": "x" * snippet_size}
+            for i in range(sources)
+        ],
+        "response": "Set `retries` on the operator. " * 30,
+        "status": "complete",
+        "langchain_run_id": str(uuid.uuid4()),
+        "score": None,
+        "sent_at": 1700000000,
+        "response_received_at": 1700000010,
+        "is_processed": False,
+        "is_example": False,
+        "route": "gpt-4-32k",
+        "conversation_id": None,
+        "turn_index": None,
+    }
+
+
+def pydantic_from_dict(doc: dict[str, Any]) -> AskAstroRequestSchema:
+    "Decodes a request the way it was before, with validation."
+    return AskAstroRequestSchema(
+        uuid=uuid.UUID(doc["uuid"]),
+        prompt=doc["prompt"],
+        messages=[
+            (HumanMessage if msg.get("type") == "human" else AIMessage)(
+                content=msg["content"],
+                additional_kwargs=msg.get("additional_kwargs", {}),
+            )
+            for msg in doc["messages"]
+        ],
+        sources=[SourceSchema(**source) for source in doc["sources"]],
+        response=doc["response"],
+        status=doc["status"],
+        langchain_run_id=uuid.UUID(doc["langchain_run_id"]),
+        score=doc["score"],
+        sent_at=doc["sent_at"],
+        response_received_at=doc.get("response_received_at"),
+        route=doc.get("route"),
+    )
+
+
+def pydantic_to_firestore(request: AskAstroRequestSchema) -> dict[str, Any]:
+    "Encodes a request the way it was before, one `dict()` per message."
+    return {
+        "uuid": str(request.uuid),
+        "prompt": request.prompt,
+        "messages": [
+            {**message.dict(), "type": message.type} for message in request.messages
+        ],
+        "sources": [source.dict() for source in request.sources],
+        "response": request.response,
+        "status": request.status,
+        "langchain_run_id": str(request.langchain_run_id),
+        "score": request.score,
+        "sent_at": request.sent_at,
+        "response_received_at": request.response_received_at,
+        "is_processed": request.is_processed,
+        "is_example": request.is_example,
+        "route": request.route,
+        "conversation_id": request.conversation_id,
+        "turn_index": request.turn_index,
+    }
+
+
+def throughput(fn: Callable[[], Any], iterations: int) -> float:
+    "Returns how many times per second `fn` runs."
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+def report(name: str, before: float, after: float):
+    print(f"{name:<28} {before:>10,.0f}/s -> {after:>10,.0f}/s ({after / before:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--sources", type=int, default=8)
+    parser.add_argument("--snippet-size", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    doc = make_document(args.messages, args.sources, args.snippet_size)
+    legacy = pydantic_from_dict(doc)
+    request = AskAstroRequest.from_dict(doc)
+    n = args.iterations
+
+    print(
+        f"{args.messages} messages, {args.sources} sources of "
+        f"{args.snippet_size:,} characters ({len(dumps(doc)):,} bytes of JSON)"
+    )
+    report(
+        "decode",
+        throughput(lambda: pydantic_from_dict(doc), n),
+        throughput(lambda: AskAstroRequest.from_dict(doc), n),
+    )
+    report(
+        "encode",
+        throughput(lambda: pydantic_to_firestore(legacy), n),
+        throughput(request.to_firestore, n),
+    )
+
+    # a save encodes the request twice, to diff it and to record what was saved
+    def legacy_save():
+        pydantic_to_firestore(legacy)
+        pydantic_to_firestore(legacy)
+
+    def save():
+        request.changed_fields()
+        request.mark_persisted()
+
+    report("save", throughput(legacy_save, n), throughput(save, n))
+
+    # Sanic encodes responses with ujson when it's installed, json otherwise
+    default_dumps = ujson.dumps if ujson is not None else json.dumps
+    report(
+        "response JSON",
+        throughput(lambda: default_dumps(doc).encode(), n),
+        throughput(lambda: dumps(doc), n),
+    )
+
+
+if __name__ == "__main__":
+    main()
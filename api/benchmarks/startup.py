@@ -0,0 +1,98 @@
+"""
+Benchmarks the cold start of the API.
+
+Reports how long `import ask_astro.app` takes in a fresh interpreter, and how
+long it takes from launching the server until it answers its first request. Run
+from the api directory, with the app's env vars set:
+
+    python -m benchmarks.startup
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def time_import(module: str) -> float:
+    "Imports the module in a fresh interpreter, and returns how long it took."
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import time; start = time.perf_counter(); "
+            f"import {module}; print(time.perf_counter() - start)",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_first_request(port: int, path: str, timeout: float) -> float:
+    """
+    Launches the server, and returns how long it took until it answered a
+    request to `path` with anything but a connection error.
+    """
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "ask_astro.app"],
+        env={**os.environ, "PORT": str(port), "LOGLEVEL": "WARNING"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}{path}", timeout=timeout
+                )
+                return time.perf_counter() - start
+            except urllib.error.HTTPError:
+                # the server is up, even if the endpoint failed
+                return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError(f"Server didn't answer {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="ask_astro.app")
+    parser.add_argument("--path", default="/metrics")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--skip-server", action="store_true", help="only time the import"
+    )
+    args = parser.parse_args()
+
+    imports = [time_import(args.module) for _ in range(args.runs)]
+    print(
+        f"import {args.module}: median {statistics.median(imports) * 1000:.0f}ms, "
+        f"max {max(imports) * 1000:.0f}ms over {args.runs} runs"
+    )
+
+    if args.skip_server:
+        return
+
+    first_requests = [
+        time_first_request(args.port, args.path, args.timeout) for _ in range(args.runs)
+    ]
+    print(
+        f"launch to first {args.path} response: "
+        f"median {statistics.median(first_requests) * 1000:.0f}ms, "
+        f"max {max(first_requests) * 1000:.0f}ms over {args.runs} runs"
+    )
+
+
+if __name__ == "__main__":
+    main()